@@ -0,0 +1,438 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmarks of the framework hot paths on synthetic tables, runs without display (Qt offscreen).
+
+Example::
+
+    python benchmarks/bench.py -o results.json
+    python benchmarks/bench.py --sizes 10k,10M -o results.json --baseline baseline.json --threshold 0.2
+
+Every benchmark is run --repeat times, the median time is reported.
+Peak memory is measured with tracemalloc in one extra run.
+With --baseline, benchmarks slower than baseline * (1 + threshold), failing or removed are reported
+and the exit code is 1.
+"""
+
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtWidgets import QApplication
+
+from ldaf.App import App
+from ldaf.DataSource import DataSource
+from ldaf.Settings import Settings
+
+from typing import Callable, Dict, List, Optional
+
+MODULE_SOURCE = '''
+name = 'Bench %(i)d'
+table = 'bench'
+settings = {}
+actions = {'key': ('Select key', print)}
+
+
+def line(app, fig=None):
+    df = app.data_source.get_table('bench')
+    ax = fig.add_subplot(111)
+    ax.plot(df['time'].values, df['x'].values)
+    return 'matplotlib'
+
+
+def table(app, fig=None):
+    return app.data_source.get_table('bench')
+
+
+functions = {'Line': line, 'Table': table}
+'''
+
+
+def make_table(n: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic table: sorted time, two float columns, integer key and a categorical column
+
+    :param n: rows
+    :param seed:
+    :return:
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'time': np.arange(n, dtype=np.int64),
+        'x': rng.standard_normal(n).cumsum(),
+        'y': rng.random(n),
+        'key': rng.integers(0, 1000, n),
+        'cat': pd.Categorical.from_codes(rng.integers(0, 20, n), ['c%d' % i for i in range(20)]),
+    })
+    df.name = 'bench'
+    return df
+
+
+class BenchDataSource(DataSource):
+    """DataSource holding generated tables"""
+    def __init__(self, n: int = 10_000, tables: int = 1):
+        super().__init__()
+        self.n = n
+        self.n_tables = tables
+
+    def load_data(self):
+        self.dfs['bench'] = make_table(self.n)
+        for i in range(1, self.n_tables):
+            df = make_table(self.n, i)
+            df.name = 'bench%d' % i
+            self.dfs[df.name] = df
+
+    def get_loaded_tables(self) -> list:
+        return list(self.dfs.keys())
+
+    def get_table_shape(self, table: str) -> tuple:
+        return self.dfs[table].shape
+
+    def on_tab_change(self, i=0):
+        pass
+
+
+class BenchSettings(Settings):
+    """Settings with a number of text settings"""
+    def __init__(self, count: int = 50):
+        super().__init__()
+        self.count = count
+
+    def add_settings(self):
+        for i in range(self.count):
+            self.set_setting('setting %d' % i, str(i))
+
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    factor = {'k': 10 ** 3, 'm': 10 ** 6}.get(s[-1:], 1)
+    return int(float(s.rstrip('km')) * factor)
+
+
+def format_size(n: int) -> str:
+    for factor, suffix in ((10 ** 6, 'M'), (10 ** 3, 'k')):
+        if n >= factor and n % factor == 0:
+            return '%d%s' % (n // factor, suffix)
+    return str(n)
+
+
+class Bench(object):
+    """Application with generated modules and tables, runs the benchmarks
+
+    """
+    def __init__(self, app: QApplication, modules: int = 1, tables: int = 1, timeout: float = 600.):
+        self.app = app
+        self.modules = modules
+        self.tables = tables
+        self.timeout = timeout
+        self.modules_dir = tempfile.mkdtemp(prefix='ldaf-bench-')
+        for i in range(modules):
+            with open(os.path.join(self.modules_dir, 'bench_%03d.py' % i), 'w') as f:
+                f.write(MODULE_SOURCE % {'i': i})
+        self.window: Optional[App] = None
+
+    def close(self):
+        if self.window is not None:
+            self.window.close()
+            self.window.deleteLater()
+            self.window = None
+            self.spin()
+        shutil.rmtree(self.modules_dir, ignore_errors=True)
+
+    def spin(self, until: Callable[[], bool] = lambda: True):
+        """Process Qt events until the condition is true
+
+        :param until:
+        :return:
+        """
+        t = time.perf_counter()
+        self.app.processEvents()
+        while not until():
+            if time.perf_counter() - t > self.timeout:
+                raise TimeoutError('benchmark timed out')
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def start(self, n: int = 10_000, settings: int = 50) -> App:
+        """Create the main window with a loaded data source
+
+        :param n: rows per table
+        :param settings: number of settings
+        :return:
+        """
+        data_source = BenchDataSource(n, self.tables)
+        self.window = App(self.app, data_source, self.modules_dir, BenchSettings(settings), 'LDAF bench',
+                          watch_modules=False)
+        self.window.resize(1600, 900)
+        self.window.show()
+        data_source.load_data()
+        data_source.bump_version()
+        self.spin()
+        self.window.load_module_tab(0)
+        return self.window
+
+    def module(self):
+        return self.window.tabs[0]
+
+    def plot(self, name: str):
+        """Run analysis function and wait until its result is shown
+
+        :param name: function name
+        :return:
+        """
+        m = self.module()
+        draws = m.canvas.draw_count
+        m.plot(m.mod.functions[name])
+        self.spin(lambda: m.worker is None)
+        if name == 'Line':
+            self.spin(lambda: m.canvas.draw_count > draws)
+
+
+def measure(func: Callable[[], None], setup: Optional[Callable[[], None]] = None, repeat: int = 3) -> dict:
+    """Median time of repeat runs and tracemalloc peak of one extra run.
+    One warm up run is not counted, eg. lazy imports on first use.
+
+    :param func: benchmarked code
+    :param setup: called before every run, not timed
+    :param repeat:
+    :return:
+    """
+    times = list()
+    for i in range(repeat + 1):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        func()
+        if i > 0:
+            times.append(time.perf_counter() - t)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'time': statistics.median(times), 'min': min(times), 'times': times, 'peak_memory': peak}
+
+
+def bench_show_table(bench: Bench, n: int, repeat: int) -> dict:
+    bench.start(n)
+    m = bench.module()
+    df = bench.window.data_source.dfs['bench']
+    return measure(lambda: (m.show_table(df), bench.spin()), repeat=repeat)
+
+
+def bench_plot_line(bench: Bench, n: int, repeat: int) -> dict:
+    bench.start(n)
+    return measure(lambda: bench.plot('Line'), repeat=repeat)
+
+
+def bench_plot_table(bench: Bench, n: int, repeat: int) -> dict:
+    bench.start(n)
+    return measure(lambda: bench.plot('Table'), repeat=repeat)
+
+
+def bench_settings_get(bench: Bench, n: int, repeat: int) -> dict:
+    """1000 reads of 50 settings"""
+    bench.start(settings=50)
+    settings = bench.window.settings
+    keys = list(settings.args.keys())
+
+    def run():
+        for _ in range(1000):
+            for k in keys:
+                settings.get(k)
+
+    return measure(run, repeat=repeat)
+
+
+def bench_settings_edit(bench: Bench, n: int, repeat: int) -> dict:
+    """1000 edits of a setting in the widget"""
+    window = bench.start(settings=50)
+    item = window.tableWidget.item(0, 1)
+
+    def run():
+        for i in range(1000):
+            item.setText(str(i))
+
+    return measure(run, repeat=repeat)
+
+
+def bench_log(bench: Bench, n: int, repeat: int) -> dict:
+    """500 log messages, shown in the log widget"""
+    window = bench.start()
+
+    def setup():
+        window.msgLog.setText('')
+
+    def run():
+        for i in range(500):
+            window.log('message %d' % i)
+        bench.spin()
+
+    return measure(run, setup, repeat)
+
+
+def bench_update_table_stats(bench: Bench, n: int, repeat: int) -> dict:
+    window = bench.start(n)
+    return measure(lambda: (window.update_table_stats(), bench.spin()), repeat=repeat)
+
+
+def bench_load_modules(bench: Bench, n: int, repeat: int) -> dict:
+    """Create the main window and load all module tabs"""
+    def run():
+        bench.start(1000)
+        for i in range(len(bench.window.tabs)):
+            bench.window.load_module_tab(i)
+        bench.spin()
+
+    def setup():
+        if bench.window is not None:
+            bench.window.close()
+            bench.window.deleteLater()
+            bench.window = None
+            bench.spin()
+
+    return measure(run, setup, repeat)
+
+
+BENCHMARKS = {
+    'show_table': (bench_show_table, True),
+    'plot_line': (bench_plot_line, True),
+    'plot_table': (bench_plot_table, True),
+    'settings_get': (bench_settings_get, False),
+    'settings_edit': (bench_settings_edit, False),
+    'log': (bench_log, False),
+    'update_table_stats': (bench_update_table_stats, True),
+    'load_modules': (bench_load_modules, False),
+}
+"name -> (function(bench, rows, repeat), depends on rows)"
+
+
+def run(app: QApplication, sizes: List[int], names: List[str], repeat: int, modules: int, tables: int) -> Dict[str, dict]:
+    results = dict()
+    for name in names:
+        func, sized = BENCHMARKS[name]
+        for n in (sizes if sized else sizes[:1]):
+            key = '%s[%s]' % (name, format_size(n)) if sized else name
+            bench = Bench(app, modules if name == 'load_modules' else 1, tables if name == 'update_table_stats' else 1)
+            try:
+                # framework messages (eg. module loading) would hide the results
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results[key] = func(bench, n, repeat)
+            except Exception as e:
+                results[key] = {'error': '%s: %s' % (type(e).__name__, e)}
+            finally:
+                bench.close()
+            r = results[key]
+            if 'error' in r:
+                print('%-32s %s' % (key, r['error']))
+            else:
+                print('%-32s %10.1f ms %10.1f MB' % (key, r['time'] * 1000, r['peak_memory'] / 2 ** 20))
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Benchmarks slower than the baseline, failed in this run or removed since the baseline.
+    Baseline results of benchmarks or sizes not selected for this run are skipped.
+
+    :param results: current results
+    :param baseline: stored results
+    :param threshold: allowed relative slowdown, eg. 0.2 for 20 %
+    :return: messages of regressions
+    """
+    regressions = list()
+    for key, b in baseline.items():
+        if key not in results and key.split('[')[0] not in BENCHMARKS:
+            line = '%-32s missing, benchmark was removed  REGRESSION' % key
+            regressions.append(line)
+            print(line)
+    for key, r in results.items():
+        if 'error' in r:
+            line = '%-32s %s  REGRESSION' % (key, r['error'])
+            regressions.append(line)
+            print(line)
+            continue
+        b = baseline.get(key)
+        if b is None or 'time' not in b:
+            continue
+        ratio = r['time'] / b['time'] if b['time'] > 0 else float('inf')
+        line = '%-32s %10.1f ms  baseline %10.1f ms  %+6.0f %%' % (key, r['time'] * 1000, b['time'] * 1000,
+                                                                   (ratio - 1) * 100)
+        if ratio > 1 + threshold:
+            regressions.append(line)
+            line += '  REGRESSION'
+        print(line)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark LDAF hot paths')
+    parser.add_argument('--sizes', default='10k,100k,1M', help='table rows, comma separated, eg. 10k,100k,1M,10M')
+    parser.add_argument('-b', '--bench', action='append', choices=list(BENCHMARKS.keys()),
+                        help='benchmark to run, repeatable, default all')
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('--modules', type=int, default=40, help='number of modules for load_modules')
+    parser.add_argument('--tables', type=int, default=20, help='number of tables for update_table_stats')
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown, default 0.2')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    results = run(app, sizes, args.bench or list(BENCHMARKS.keys()), args.repeat, args.modules, args.tables)
+
+    if args.output:
+        meta = {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'repeat': args.repeat,
+        }
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('%d regression(s) above %.0f %%' % (len(regressions), args.threshold * 100))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,77 +14,146 @@
 # You should have received a copy of the GNU General Public License
 # along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
 
-import importlib
+import concurrent.futures
+import multiprocessing
 import os.path
+import sys
+import time
 
-from PyQt5.QtCore import QThread
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTableWidgetItem, QHeaderView
+from PyQt5.QtCore import pyqtSignal, QTimer
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTableWidgetItem, QHeaderView, QProgressBar, QPushButton
 from PyQt5.Qt import QTextCursor
-import matplotlib
-matplotlib.use('QT5Agg')
-import matplotlib.style
-import matplotlib.offsetbox
-matplotlib.style.use('ggplot')
 
+from .Startup import startup, preload
 from .MainWindow import Ui_MainWindow
-from .DataSource import DataSource
+from .DataSource import DataSource, timed_load, table_nbytes
 from .Module import Module
 from .Settings import Settings
+from .Worker import Worker, CancelToken
+from .ResultCache import ResultCache
+from .ProcessPool import ProcessPool
+from .TableStore import TableStore
+from .ModuleWatcher import ModuleWatcher, source_hash, reload_helpers
+from .Profiler import Profiler, ProfileRun
+from .Widgets.ProfileHistory import ProfileHistory
 from . import helper
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-
-class Worker(QThread):
-    def __init__(self, func, parent=None):
-        QThread.__init__(self, parent)
-        self.func = func
-
-    def run(self):
-        self.func()
+startup.add('import ldaf.App', startup.elapsed())
 
 
 class App(QMainWindow, Ui_MainWindow):
     """Main Application Window
 
     """
-
-    def __init__(self, app, data_source, modules_dir, settings, title: str = 'LDAF'):
+    _log_signal = pyqtSignal(str)
+    _msg_signal = pyqtSignal(str)
+    _table_loaded_signal = pyqtSignal(str, object, float)
+    "table name, table, load time, emitted from the loader thread"
+    _table_state_signal = pyqtSignal(str)
+    "table name, emitted when a table is spilled, reloaded or computed"
+
+    def __init__(self, app, data_source, modules_dir, settings, title: str = 'LDAF', cache_size: int = 512 * 2 ** 20,
+                 pool_workers: Optional[int] = None, watch_modules: bool = True):
         """
 
         :type app: QApplication
         :type data_source: DataSource
         :type modules_dir: str
         :type settings: Settings
+        :param cache_size: memory budget in bytes for cached results of analysis functions
+        :param pool_workers: number of processes for functions decorated with run_in_pool, default cpu count
+        :param watch_modules: reload changed analysis modules and their helper modules automatically
         """
+        t = time.perf_counter()
         Ui_MainWindow.__init__(self)
         QMainWindow.__init__(self)
         settings.app = self
         data_source.app = self
         self.worker: Optional[Worker] = None
+        self.task_token: Optional[CancelToken] = None
+        "cancellation token of the running analysis function"
+
+        self._reload_pending = False
+        "a module reload waits for a table load or analysis function to finish"
+
+        self.result_cache = ResultCache(cache_size)
+        "cached results of analysis functions, used by modules with cache = True"
+
+        self.profiler = Profiler()
+        "measures analysis function runs, enabled in the Profile menu"
+
+        self.profile_history: Optional[ProfileHistory] = None
+
+        self.index_worker: Optional[Worker] = None
+        "builds the declared indexes of the data source in the background"
+
+        self._index_pending = False
+
+        self.pool_workers = pool_workers
+        self.process_pool: Optional[ProcessPool] = None
+        "started on first use by a function decorated with run_in_pool"
 
         self.tableActions = {}
         "right clock actions for table view"
 
+        self.helper_hashes: Dict[str, str] = dict()
+        "user helper modules imported by analysis modules: module name -> source hash"
+
         self.app = app
         self.modules_dir = modules_dir
         self.settings = settings
         self.data_source = data_source
 
         self.setupUi(self)
+        self.settings.connect_widget()
         self.setWindowTitle(title)
 
+        self._log_signal.connect(self._log)
+        self._msg_signal.connect(self.statusbar.showMessage)
+        self._table_loaded_signal.connect(self.on_table_loaded)
+        self._table_state_signal.connect(self.update_table_row)
+        if isinstance(data_source.dfs, TableStore):
+            data_source.dfs.on_change = self.notify_table_changed
+        self.progressBar = QProgressBar()
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.setRange(0, 100)
+        self.progressBar.hide()
+        self.statusbar.addPermanentWidget(self.progressBar)
+        self.cancelButton = QPushButton('Cancel')
+        self.cancelButton.clicked.connect(self.on_cancel)
+        self.cancelButton.hide()
+        self.statusbar.addPermanentWidget(self.cancelButton)
+
         self.actionLoad_lite.triggered.connect(self.on_load_data)
+        self.actionRefresh_data.triggered.connect(self.on_refresh_data)
         self.actionReload_modules.triggered.connect(self.on_reload_modules)
+        self.actionProfile.toggled.connect(self.on_profile_toggled)
+        self.actionProfile_cprofile.toggled.connect(self.on_cprofile_toggled)
+        self.actionProfile_history.triggered.connect(self.on_profile_history)
+        self.profiler.on_record = self.on_profile_record
+        startup.add('main window', time.perf_counter() - t)
+
+        # heavy modules not needed to show the window
+        preload(['pandas', 'matplotlib.pyplot', 'matplotlib.backends.backend_qt5agg', 'ldaf.Decimation', 'ldaf.Raster'])
+
         self.tabs: List[Module] = list()
         "Loaded analysis modules as TabWidget"
 
-        self.load_modules()
+        self.module_watcher: Optional[ModuleWatcher] = None
+        if watch_modules:
+            self.module_watcher = ModuleWatcher(modules_dir, self)
+            self.module_watcher.changed.connect(self.reload_modules)
+
+        with startup.phase('discover modules'):
+            self.load_modules()
+        t = time.perf_counter()
         self.settings.add_settings()
 
         self.active_table = None
         if len(self.tabs) > 0:
-            self.active_table = self.tabs[0].mod.table
+            self.active_table = self.tabs[0].table_name
 
         self.tabWidget.currentChanged.connect(self.on_tab_changed)
 
@@ -95,7 +164,36 @@ class App(QMainWindow, Ui_MainWindow):
         header.setSectionResizeMode(QHeaderView.ResizeToContents)
 
         for m in self.tabs:
-            m.reload()
+            m.apply_settings()
+        startup.add('settings', time.perf_counter() - t)
+
+        # import the module of the first tab when the window is shown, other modules on first activation
+        QTimer.singleShot(0, self._on_shown)
+
+    def _on_shown(self):
+        """First event loop iteration: load the first tab and log the startup report
+
+        :return:
+        """
+        with startup.phase('first tab'):
+            self.load_module_tab(self.tabWidget.currentIndex())
+        self.log(startup.report())
+
+    def get_process_pool(self) -> ProcessPool:
+        """Return process pool, start it on first use
+
+        :return:
+        """
+        if self.process_pool is None:
+            self.process_pool = ProcessPool(self.pool_workers)
+        return self.process_pool
+
+    def closeEvent(self, event):
+        if self.process_pool is not None:
+            self.process_pool.close()
+        if isinstance(self.data_source.dfs, TableStore):
+            self.data_source.dfs.close()
+        super().closeEvent(event)
 
     def _get_current_module(self) -> Module:
         return self.tabs[self.tabWidget.currentIndex()]
@@ -116,6 +214,62 @@ class App(QMainWindow, Ui_MainWindow):
             if f.endswith('.py'):
                 m = Module(self, os.path.join(self.modules_dir, f))
                 self.tabs.append(m)
+        self.load_dynamic_modules()
+        self.track_modules()
+
+    def load_module_tab(self, i: int) -> bool:
+        """Import module of tab i and build its widgets, if not loaded yet
+
+        :param i: tab index
+        :return: True if the module is loaded
+        """
+        if not 0 <= i < len(self.tabs):
+            return False
+        m = self.tabs[i]
+        if not m.loaded:
+            try:
+                m.load()
+            except Exception as e:
+                self.log('Error loading %s: %s' % (m.module_path, e))
+                self.msg('Error: %s' % e)
+                return False
+            self.track_modules()
+        return True
+
+    def load_dynamic_modules(self):
+        """Load modules whose table is not a literal, the tab is enabled by the table name
+
+        :return:
+        """
+        for i, m in enumerate(self.tabs):
+            if not m.loaded and 'table' in m.info['dynamic']:
+                self.load_module_tab(i)
+
+    def get_table_actions(self, column: str) -> list:
+        """Table actions for a column, modules declaring actions for it
+        (or whose actions are not a literal) are loaded first
+
+        :param column: column name
+        :return: list of [module, text, function]
+        """
+        for i, m in enumerate(self.tabs):
+            actions = m.info['actions']
+            if not m.loaded and (actions is None or column in actions):
+                self.load_module_tab(i)
+        return self.tableActions.get(column, list())
+
+    def track_modules(self):
+        """Record source hashes of helper modules and watch all module files
+
+        :return:
+        """
+        for m in self.tabs:
+            for name in m.dependencies:
+                if name not in self.helper_hashes:
+                    self.helper_hashes[name] = source_hash(sys.modules[name].__file__)
+        if self.module_watcher is not None:
+            self.module_watcher.watch([m.module_path for m in self.tabs] +
+                                      [sys.modules[n].__file__ for n in self.helper_hashes if n in sys.modules])
 
     def on_tab_changed(self, i=0):
         """callback on Analysis Tab change
@@ -123,11 +277,15 @@ class App(QMainWindow, Ui_MainWindow):
         :param i: new tab index
         :return:
         """
+        if not 0 <= i < len(self.tabs):
+            # no tab left after the last module was removed
+            return
+        self.load_module_tab(i)
         # reset canvas for all modules to clear callbacks
         for mod in self.tabs:
             mod.reset_canvas()
 
-        self.active_table = self.tabs[i].mod.table
+        self.active_table = self.tabs[i].table_name
         self.data_source.on_tab_change(i)
 
     def on_reload_modules(self):
@@ -135,61 +293,245 @@ class App(QMainWindow, Ui_MainWindow):
 
         :return:
         """
-        for mod in self.tabs:
-            mod.reload()
+        self.reload_modules()
+
+    def reload_modules(self) -> List[Module]:
+        """Reload modules whose source changed or that import a changed helper module,
+        other modules keep their state and cached results.
+        New files in modules_dir are loaded as new tabs, tabs of deleted files are removed.
+        While tables are loading or an analysis function runs the reload is deferred until they finished,
+        a running function of a deleted module is cancelled.
+
+        :return: reloaded and new modules, empty if deferred
+        """
+        if self.worker is not None or any(m.worker is not None for m in self.tabs):
+            if any(m.worker is not None and not os.path.exists(m.module_path) for m in self.tabs):
+                self.on_cancel()
+            if not self._reload_pending:
+                self._reload_pending = True
+                QTimer.singleShot(500, self._deferred_reload)
+            return list()
+
+        t = time.perf_counter()
+        changed = [name for name, h in self.helper_hashes.items()
+                   if name in sys.modules and source_hash(sys.modules[name].__file__) != h]
+        helpers = set(reload_helpers(changed, self.helper_hashes.keys()))
+        for name in helpers:
+            self.helper_hashes[name] = source_hash(sys.modules[name].__file__)
+
+        removed = list()
+        for m in [m for m in self.tabs if not os.path.exists(m.module_path)]:
+            # drop from tabs first, removing the tab emits currentChanged
+            self.tabs.remove(m)
+            m.remove()
+            removed.append(os.path.basename(m.module_path))
+        if removed:
+            self.log('Removed %s' % ', '.join(sorted(removed)))
+
+        reloaded = list()
+        for m in self.tabs:
+            helpers_changed = bool(m.dependencies & helpers)
+            if helpers_changed or m.source_changed():
+                try:
+                    m.reload(helpers_changed)
+                except Exception as e:
+                    self.log('Error reloading %s: %s' % (m.module_path, e))
+                    continue
+                reloaded.append(m)
+
+        loaded = {os.path.basename(m.module_path) for m in self.tabs}
+        for f in sorted(os.listdir(self.modules_dir)):
+            if f.endswith('.py') and f not in loaded:
+                try:
+                    m = Module(self, os.path.join(self.modules_dir, f))
+                    m.apply_settings()
+                except Exception as e:
+                    self.log('Error loading %s: %s' % (f, e))
+                    continue
+                self.tabs.append(m)
+                reloaded.append(m)
+
+        self.load_dynamic_modules()
+        self.track_modules()
+        if reloaded or helpers:
+            self.log('Reloaded %s in %.0f ms' % (', '.join(sorted(os.path.basename(m.module_path) for m in reloaded)
+                                                           + sorted(helpers)), (time.perf_counter() - t) * 1000))
+        return reloaded
+
+    def _deferred_reload(self):
+        self._reload_pending = False
+        self.reload_modules()
+
+    def on_profile_toggled(self, checked: bool):
+        """callback on profile menu action
+
+        :param checked:
+        :return:
+        """
+        self.profiler.enabled = checked
+        self.log('Profiling %s' % ('enabled' if checked else 'disabled'))
+
+    def on_cprofile_toggled(self, checked: bool):
+        """callback on cProfile dumps menu action, enables profiling as well
 
-        importlib.reload(helper)
+        :param checked:
+        :return:
+        """
+        self.profiler.cprofile = checked
+        if checked:
+            self.actionProfile.setChecked(True)
+
+    def on_profile_history(self):
+        """callback on profile history menu action
+
+        :return:
+        """
+        if self.profile_history is None:
+            self.profile_history = ProfileHistory(self.profiler, self)
+        self.profile_history.refresh()
+        self.profile_history.show()
+        self.profile_history.raise_()
+
+    def on_profile_record(self, run: ProfileRun):
+        """Log finished profiled run and add it to the history dialog
+
+        :param run:
+        :return:
+        """
+        phases = ', '.join('%s %.0f ms' % (name, seconds * 1000) for name, seconds in run.phases.items())
+        msg = 'Profile %s / %s (%s): %.0f ms (%s)' % (run.module, run.function, run.status, run.total * 1000, phases)
+        if run.peak_memory is not None:
+            msg += ', cpu %.0f ms, peak memory %s' % (run.cpu * 1000, helper.format_bytes(run.peak_memory))
+        if run.profile is not None:
+            msg += ', profile %s' % run.profile
+        self.log(msg)
+        if self.profile_history is not None and self.profile_history.isVisible():
+            self.profile_history.refresh()
 
     def log(self, msg):
-        """Log message to message log widget
+        """Log message to message log widget.
+        Can be called from worker threads.
 
         :return:
         """
+        self._log_signal.emit(str(msg))
+
+    def _log(self, msg: str):
         self.msgLog.setText('%s\n%s' % (self.msgLog.toPlainText(), msg))
         self.msgLog.moveCursor(QTextCursor.End)
 
     def msg(self, msg: str):
-        """Show message in status bar
+        """Show message in status bar.
+        Can be called from worker threads.
 
         :param msg:
         :return:
         """
-        self.statusbar.showMessage(msg)
+        self._msg_signal.emit(msg)
 
     def enable(self):
         """Enable application window
 
         :return:
         """
-        self.setEnabled(True)
+        self.centralWidget().setEnabled(True)
+        self.menuBar().setEnabled(True)
         self.app.processEvents()
 
     def disable(self):
-        """Disable application window
+        """Disable application window, the status bar stays enabled
 
         :return:
         """
-        self.setEnabled(False)
+        self.centralWidget().setEnabled(False)
+        self.menuBar().setEnabled(False)
         self.app.sendPostedEvents()
         self.app.processEvents()
 
+    def start_task(self, token: CancelToken):
+        """Show progress bar and cancel button for a running analysis function
+
+        :param token: cancellation token of the running function
+        :return:
+        """
+        self.task_token = token
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.cancelButton.setEnabled(True)
+        self.cancelButton.show()
+
+    def stop_task(self):
+        """Hide progress bar and cancel button
+
+        :return:
+        """
+        self.task_token = None
+        self.progressBar.hide()
+        self.cancelButton.hide()
+
+    def set_progress(self, percent: int):
+        """Show progress of the running analysis function in the status bar
+
+        :param percent: 0 - 100
+        :return:
+        """
+        self.progressBar.setValue(percent)
+
+    def on_cancel(self):
+        """callback on cancel button
+
+        :return:
+        """
+        if self.task_token is not None:
+            self.task_token.cancel()
+            self.cancelButton.setEnabled(False)
+            self.msg('cancelling...')
+
     def on_load_data(self):
         """callback on load data menu action
 
         :return:
         """
+        ds = self.data_source
+        snapshot = ds.get_snapshot()
+        sources = None
+        use_snapshot = False
+        if snapshot is not None:
+            try:
+                sources = ds.source_fingerprint()
+                use_snapshot = snapshot.is_valid(sources, ds.get_loaders().keys())
+            except OSError as e:
+                self.log(f'Error on check snapshot: {e}')
+                snapshot = None
+
+        loaders = ds.get_loaders()
+        if loaders and not use_snapshot:
+            self.load_tables(loaders, snapshot, sources)
+            return
+
         self.msg('loading data...')
         self.disable()
 
         def worker():
             try:
-                self.data_source.load_data()
+                if use_snapshot:
+                    ds.load_snapshot(snapshot)
+                    self.log('Loaded snapshot %s' % snapshot.directory)
+                    return
+                ds.load_data()
+                ds.optimize_tables()
             except Exception as e:
                 self.log(f'Error on load data: {e}')
+                return
+            if snapshot is not None:
+                self.save_snapshot(snapshot, ds.dfs, sources)
 
         def finished():
+            self.data_source.bump_version()
+            self.result_cache.clear()
             self.data_source.on_tab_change()
             self.update_table_stats()
+            self.build_indexes()
             self.msg('ready')
             self.log('Data loaded')
             self.worker = None
@@ -199,27 +541,229 @@ class App(QMainWindow, Ui_MainWindow):
         self.worker.finished.connect(finished)
         self.worker.start()
 
-    def update_table_stats(self):
+    def on_refresh_data(self):
+        """callback on refresh data menu action: append new rows instead of loading all data
+
+        :return:
+        """
+        if self.worker is not None:
+            return
+        self.msg('refreshing data...')
+        self.actionLoad_lite.setEnabled(False)
+        self.actionRefresh_data.setEnabled(False)
+        ds = self.data_source
+
+        def worker():
+            t = time.perf_counter()
+            changed = ds.refresh()
+            return changed, time.perf_counter() - t
+
+        def finished():
+            self.worker = None
+            self.actionLoad_lite.setEnabled(True)
+            self.actionRefresh_data.setEnabled(True)
+            if w.error is not None:
+                self.log(f'Error on refresh data: {w.error}')
+                self.msg('ready')
+                return
+            changed, elapsed = w.result
+            if changed:
+                self.data_source.on_tab_change(self.tabWidget.currentIndex())
+                self.update_table_stats(changed)
+                self.build_indexes()
+            self.msg('ready')
+            self.log('Refreshed %s in %.1f s' % (', '.join(changed) or 'nothing', elapsed))
+
+        self.worker = w = Worker(worker)
+        self.worker.finished.connect(finished)
+        self.worker.start()
+
+    def save_snapshot(self, snapshot, dfs: dict, sources: list):
+        """Write snapshot of loaded tables, call from worker thread
+
+        :param snapshot: Snapshot
+        :param dfs: loaded tables
+        :param sources: fingerprint of the source files taken before loading
+        :return:
+        """
+        self.msg('writing snapshot...')
+        try:
+            snapshot.save(dfs, sources, self.data_source.marks, self.data_source.get_loaders().keys())
+            self.log('Snapshot written to %s' % snapshot.directory)
+        except Exception as e:
+            self.log(f'Error on save snapshot: {e}')
+
+    def load_tables(self, loaders: dict, snapshot=None, sources: list = None):
+        """Run table loaders concurrently.
+        Each table is shown in loaded tables as soon as it is ready,
+        modules using it are enabled at the same time.
+
+        :param loaders: table name -> callable, see DataSource.get_loaders
+        :param snapshot: Snapshot written after all tables are loaded, optional
+        :param sources: fingerprint of the source files
+        :return:
+        """
+        self.msg('loading data...')
+        self.actionLoad_lite.setEnabled(False)
+        self.actionReload_modules.setEnabled(False)
+        for mod in self.tabs:
+            mod.tab.setEnabled(mod.table_name in self.data_source.dfs and mod.table_name not in loaders)
+        for name in loaders:
+            self.update_table_row(name, loading=True)
+        self.app.processEvents()
+
+        ds = self.data_source
+        workers = ds.loader_workers or len(loaders)
+
+        def worker():
+            if ds.loader_processes:
+                # spawn, forking a process with a running Qt application is not safe
+                executor = concurrent.futures.ProcessPoolExecutor(
+                    workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='ldaf-loader')
+            loaded = dict()
+            with executor:
+                futures = {executor.submit(timed_load, loader): name for name, loader in loaders.items()}
+                for f in concurrent.futures.as_completed(futures):
+                    name = futures[f]
+                    try:
+                        df, elapsed = f.result()
+                        df = ds.optimize_table(name, df)
+                    except Exception as e:
+                        self.log(f'Error on load table {name}: {e}')
+                        continue
+                    loaded[name] = df
+                    self._table_loaded_signal.emit(name, df, elapsed)
+            if snapshot is not None and len(loaded) == len(loaders):
+                self.save_snapshot(snapshot, loaded, sources)
+
+        def finished():
+            self.result_cache.clear()
+            self.data_source.on_tab_change(self.tabWidget.currentIndex())
+            self.update_table_stats()
+            self.build_indexes()
+            for mod in self.tabs:
+                mod.tab.setEnabled(True)
+            self.actionLoad_lite.setEnabled(True)
+            self.actionReload_modules.setEnabled(True)
+            self.msg('ready')
+            self.log('Data loaded')
+            self.worker = None
+
+        self.worker = Worker(worker)
+        self.worker.finished.connect(finished)
+        self.worker.start()
+
+    def build_indexes(self):
+        """Build missing or outdated indexes declared by the data source in the background
+
+        :return:
+        """
+        if not self.data_source.index_specs:
+            return
+        if self.index_worker is not None:
+            self._index_pending = True
+            return
+
+        def worker():
+            t = time.perf_counter()
+            built = self.data_source.build_indexes()
+            return built, time.perf_counter() - t
+
+        def finished():
+            self.index_worker = None
+            if w.error is not None:
+                self.log(f'Error on build indexes: {w.error}')
+            elif w.result[0]:
+                built, elapsed = w.result
+                self.log('Indexes %s built in %.1f s' % (', '.join('%s.%s' % k for k in built), elapsed))
+            if self._index_pending:
+                self._index_pending = False
+                self.build_indexes()
+
+        self.index_worker = w = Worker(worker)
+        self.index_worker.finished.connect(finished)
+        self.index_worker.start()
+
+    def on_table_loaded(self, name: str, df, elapsed: float):
+        """callback when a table loader finished, runs in the GUI thread
+
+        :param name: table name
+        :param df: table
+        :param elapsed: load time in seconds
+        :return:
+        """
+        self.data_source.on_table_loaded(name, df, elapsed)
+        self.update_table_row(name)
+        self.log('Table %s loaded in %.1f s' % (name, elapsed))
+        for mod in self.tabs:
+            if mod.table_name == name:
+                mod.tab.setEnabled(True)
+
+    def notify_table_changed(self, name: str):
+        """Update row of table in loaded tables widget.
+        Can be called from worker threads.
+
+        :param name: table name
+        :return:
+        """
+        self._table_state_signal.emit(name)
+
+    def update_table_stats(self, tables: Optional[list] = None):
         """Update statistics about loaded data tables
 
+        :param tables: table names, default all loaded tables
         :return:
         """
-        rows = self.loadedTables.rowCount()
-        done = list()
-        for i in range(0, rows):
-            t = self.loadedTables.item(i, 0).text()
-            c = self.loadedTables.item(i, 1)
-            if t in self.data_source.dfs.keys():
-                c.setText("{:,}".format(self.data_source.dfs[t].shape[0]))
-                done.append(t)
+        if tables is None:
+            tables = self.data_source.get_loaded_tables()
+        for t in tables:
+            self.update_table_row(t)
 
-        for t in self.data_source.get_loaded_tables():
-            if t in done:
-                continue
+    def update_table_row(self, name: str, loading: bool = False):
+        """Update or insert row of table in loaded tables widget
 
-            row_position = self.loadedTables.rowCount()
-            self.loadedTables.insertRow(row_position)
-            self.loadedTables.setItem(row_position, 0, QTableWidgetItem(t))
-            shape = self.data_source.get_table_shape(t)
-            self.loadedTables.setItem(row_position, 1, QTableWidgetItem("{:,}".format(shape[0])))
-            self.loadedTables.setItem(row_position, 2, QTableWidgetItem("{:,}".format(shape[1])))
+        :param name: table name
+        :param loading: table is still loading
+        :return:
+        """
+        row = None
+        for i in range(self.loadedTables.rowCount()):
+            if self.loadedTables.item(i, 0).text() == name:
+                row = i
+                break
+        if row is None:
+            row = self.loadedTables.rowCount()
+            self.loadedTables.insertRow(row)
+            self.loadedTables.setItem(row, 0, QTableWidgetItem(name))
+
+        dfs = self.data_source.dfs
+        if loading:
+            values = ['loading...', '', '', '', '', '']
+        else:
+            stats = self.data_source.load_stats.get(name, dict())
+            nbytes = stats.get('bytes')
+            state = ''
+            if isinstance(dfs, TableStore) and name in dfs:
+                # do not reload spilled tables
+                shape = dfs.shape(name)
+                state = dfs.state(name)
+                if nbytes is None:
+                    nbytes = dfs.nbytes(name)
+            else:
+                shape = self.data_source.get_table_shape(name)
+                if nbytes is None:
+                    nbytes = table_nbytes(dfs.get(name))
+            elapsed = stats.get('elapsed')
+            memory = ''
+            if 'memory' in stats:
+                memory = '%s (was %s)' % (helper.format_bytes(stats['memory']),
+                                          helper.format_bytes(stats['memory_before']))
+            if name in self.data_source.derived:
+                state = 'derived, %s' % state if state else 'derived'
+            values = ["{:,}".format(shape[0]), "{:,}".format(shape[1]),
+                      '' if nbytes is None else helper.format_bytes(nbytes),
+                      '' if elapsed is None else '%.1f s' % elapsed, memory, state]
+        for i, v in enumerate(values):
+            self.loadedTables.setItem(row, i + 1, QTableWidgetItem(v))
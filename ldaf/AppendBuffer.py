@@ -0,0 +1,220 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict
+
+HEADROOM = 0.125
+"spare capacity as fraction of the rows, the buffers grow geometrically by this factor"
+
+MIN_HEADROOM = 1024
+"spare capacity in rows for small tables"
+
+
+def _capacity(n: int) -> int:
+    """Capacity for n rows with headroom"""
+    return n + max(int(n * HEADROOM), MIN_HEADROOM)
+
+
+def _empty(dtype, n: int):
+    """Array of n missing values, numpy array for numpy dtypes, otherwise extension array"""
+    if isinstance(dtype, np.dtype):
+        return np.empty(n, dtype=dtype)
+    return pd.array(np.full(n, None, dtype=object), dtype=dtype)
+
+
+class _Column(object):
+    """Growable column, categorical columns are stored as codes,
+    columns of extension dtypes (eg. strings, nullable integers) as extension array"""
+    def __init__(self, s: pd.Series, capacity: int):
+        self.categories = None
+        self.ordered = False
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            self.categories = s.dtype.categories
+            self.ordered = s.dtype.ordered
+            values = np.asarray(s.array.codes)
+        else:
+            values = s.array if not isinstance(s.dtype, np.dtype) else s.to_numpy()
+        self.data = _empty(values.dtype, capacity)
+        self.data[:len(values)] = values
+
+    @staticmethod
+    def _fits(values: np.ndarray, dtype: np.dtype) -> bool:
+        """True if values can be stored in dtype without overflow, truncation or loss of NA"""
+        if len(values) == 0 or np.can_cast(values.dtype, dtype, 'safe'):
+            return True
+        if values.dtype.kind not in 'biuf' or dtype.kind not in 'iuf':
+            return False
+        finite = values[np.isfinite(values)] if values.dtype.kind == 'f' else values
+        if dtype.kind == 'f':
+            return len(finite) == 0 or np.abs(finite).max() <= np.finfo(dtype).max
+        if len(finite) != len(values) or (values.dtype.kind == 'f' and (finite != np.round(finite)).any()):
+            # NaN, inf or fractions in an integer column
+            return False
+        info = np.iinfo(dtype)
+        return info.min <= values.min() and values.max() <= info.max
+
+    def _convert(self, s: pd.Series, n: int):
+        """Values of s in the dtype of the buffer, the buffer is upcast if they do not fit
+
+        :param s: new values
+        :param n: filled rows of the buffer
+        :return:
+        """
+        dtype = self.data.dtype
+        if self.categories is not None:
+            new = pd.Index(s.dropna().unique()).difference(self.categories)
+            if len(new):
+                # append new categories, the codes of existing rows stay valid
+                self.categories = self.categories.append(new)
+                if len(self.categories) > np.iinfo(dtype).max:
+                    self.upcast(np.result_type(dtype, np.min_scalar_type(-len(self.categories))), n)
+            return self.categories.get_indexer(s).astype(self.data.dtype)
+        if not isinstance(dtype, np.dtype):
+            try:
+                return s.astype(dtype).array
+            except (TypeError, ValueError, OverflowError):
+                pass
+            # values do not fit the extension dtype (eg. Int8), widen it or keep the column as object
+            dtype = pd.concat([pd.Series(self.data[:0]), s.reset_index(drop=True)]).dtype
+            if isinstance(dtype, np.dtype):
+                dtype = np.dtype(object)
+            self.upcast(dtype, n)
+            return s.astype(dtype).array if not isinstance(dtype, np.dtype) else s.to_numpy(dtype=object)
+        if dtype == object:
+            return s.to_numpy(dtype=object)
+        if dtype.kind not in 'biuf':
+            return s.astype(dtype).to_numpy()
+        values = s.to_numpy()
+        if values.dtype == object or not isinstance(s.dtype, np.dtype):
+            # nullable or object values, NA becomes NaN
+            if s.isna().any() or not hasattr(s.dtype, 'numpy_dtype'):
+                values = s.to_numpy(dtype='float64', na_value=np.nan)
+            else:
+                values = s.to_numpy(dtype=s.dtype.numpy_dtype)
+        if not self._fits(values, dtype):
+            dtype = np.result_type(dtype, values.dtype)
+            if dtype.kind in 'biu' and not self._fits(values, dtype):
+                dtype = np.dtype('float64')
+            self.upcast(dtype, n)
+        return values.astype(dtype, copy=False)
+
+    def upcast(self, dtype, n: int):
+        """Change the dtype of the buffer, keeps the first n rows
+
+        :param dtype:
+        :param n: filled rows
+        :return:
+        """
+        data = _empty(dtype, len(self.data))
+        old = self.data[:n]
+        data[:n] = old if isinstance(dtype, np.dtype) or isinstance(old, np.ndarray) else old.astype(dtype)
+        self.data = data
+
+    def put(self, s: pd.Series, n: int):
+        """Write s after the first n rows, the capacity must be sufficient
+
+        :param s: new values
+        :param n: filled rows
+        :return:
+        """
+        values = self._convert(s, n)
+        self.data[n:n + len(values)] = values
+
+    def grow(self, capacity: int, n: int):
+        data = _empty(self.data.dtype, capacity)
+        data[:n] = self.data[:n]
+        self.data = data
+
+    def values(self, n: int):
+        """Filled rows, a view on the buffer"""
+        if self.categories is not None:
+            return pd.Categorical.from_codes(self.data[:n], categories=self.categories, ordered=self.ordered)
+        return self.data[:n]
+
+
+class AppendBuffer(object):
+    """Table with amortized O(1) appends.
+    The columns are preallocated arrays with a bounded headroom (HEADROOM) which grow by the same factor when full,
+    so large tables need little more than their own size. Frame returns a DataFrame of views on the filled part
+    without copying.
+
+    """
+    def __init__(self, df: pd.DataFrame, capacity: int = None):
+        """
+
+        :param df: initial rows
+        :param capacity: initial capacity, default the rows and their headroom
+        """
+        self.n = len(df)
+        self.capacity = max(capacity or _capacity(self.n), self.n)
+        self.name = getattr(df, 'name', None)
+        self.columns: Dict[object, _Column] = {col: _Column(df.iloc[:, i], self.capacity)
+                                               for i, col in enumerate(df.columns)}
+        self.index = None
+        "index buffer, None for a RangeIndex"
+        if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+            self.index = _Column(df.index.to_series(), self.capacity)
+        self.index_name = df.index.name
+
+    def append(self, df: pd.DataFrame):
+        """Append rows, the columns must match
+
+        :param df: new rows
+        :return:
+        """
+        if list(df.columns) != list(self.columns.keys()):
+            raise ValueError('columns do not match')
+        k = len(df)
+        if self.n + k > self.capacity:
+            capacity = _capacity(self.n + k)
+            for c in self._buffers():
+                c.grow(capacity, self.n)
+            self.capacity = capacity
+
+        for i, c in enumerate(self.columns.values()):
+            c.put(df.iloc[:, i], self.n)
+        if self.index is not None:
+            self.index.put(df.index.to_series(), self.n)
+        self.n += k
+
+    def _buffers(self):
+        return list(self.columns.values()) + ([self.index] if self.index is not None else [])
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame of the filled rows, the columns are views on the buffers
+
+        :return:
+        """
+        if self.index is None:
+            index = pd.RangeIndex(self.n)
+        else:
+            values = self.index.values(self.n)
+            index = pd.Index(values, dtype=values.dtype, copy=False)
+        data = dict()
+        for col, c in self.columns.items():
+            values = c.values(self.n)
+            if values.dtype == object:
+                # explicit dtype, otherwise pandas scans object arrays to infer a dtype
+                values = pd.Series(values, index=index, dtype=object, copy=False)
+            data[col] = values
+        df = pd.DataFrame(data, index=index, copy=False)
+        df.index.name = self.index_name
+        if self.name is not None:
+            df.name = self.name
+        return df
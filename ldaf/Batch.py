@@ -0,0 +1,358 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Headless batch runner: load the data once and run analysis functions without Qt.
+Figures are written with the Agg backend, tables as Parquet or CSV.
+
+Example::
+
+    python -m ldaf.Batch DataSource.py Modules -o report --settings settings.json --grid grid.json
+
+settings.json holds setting key -> value, grid.json setting key -> list of values;
+every function runs once per combination of the grid values.
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+from .DataSource import DataSource, timed_load
+from .helper import load_module, call_analysis, kind_of, parse_setting
+
+from typing import Dict, List, Optional
+
+
+class BatchSettings(object):
+    """Settings read from a file, replaces Settings without Qt widgets"""
+    def __init__(self, args: dict):
+        self.args = dict(args)
+
+    def get(self, key):
+        return self.args.get(key)
+
+    def set(self, key, value):
+        self.args[key] = value
+
+
+class _Module(object):
+    handler_f = None
+
+
+class _Token(object):
+    """CancelToken replacement, batch runs are not cancelled"""
+    cancelled = False
+
+    def check(self):
+        pass
+
+
+class BatchApp(object):
+    """Replacement of App passed to the DataSource and the analysis functions.
+    Provides settings, data_source, log and msg.
+
+    """
+    def __init__(self, data_source: DataSource, settings: dict, verbose: bool = True):
+        self.data_source = data_source
+        self.settings = BatchSettings(settings)
+        self.current_module = _Module()
+        self.verbose = verbose
+        self.logs = list()
+        data_source.app = self
+
+    def log(self, msg):
+        self.logs.append(str(msg))
+        if self.verbose:
+            print(msg, file=sys.stderr)
+
+    def msg(self, msg):
+        pass
+
+    def notify_table_changed(self, name: str):
+        pass
+
+
+def load_data_source(spec: str) -> DataSource:
+    """Import DataSource class from file and create it
+
+    :param spec: path.py or path.py:ClassName (default class DataSource)
+    :return:
+    """
+    path, _, cls = spec.partition(':')
+    mod = load_module(path)
+    return getattr(mod, cls or 'DataSource')()
+
+
+def load(data_source: DataSource):
+    """Load all tables like App: snapshot, table loaders or load_data
+
+    :param data_source:
+    :return:
+    """
+    ds = data_source
+    snapshot = ds.get_snapshot()
+    sources = ds.source_fingerprint() if snapshot is not None else None
+    if snapshot is not None and snapshot.is_valid(sources, ds.get_loaders().keys()):
+        ds.load_snapshot(snapshot)
+        ds.app.log('Loaded snapshot %s' % snapshot.directory)
+        return
+
+    loaders = ds.get_loaders()
+    if loaders:
+        with concurrent.futures.ThreadPoolExecutor(ds.loader_workers or len(loaders)) as ex:
+            futures = {ex.submit(timed_load, loader): name for name, loader in loaders.items()}
+            for f in concurrent.futures.as_completed(futures):
+                df, elapsed = f.result()
+                name = futures[f]
+                ds.on_table_loaded(name, ds.optimize_table(name, df), elapsed)
+    else:
+        ds.load_data()
+        ds.optimize_tables()
+        ds.bump_version()
+    if snapshot is not None:
+        try:
+            snapshot.save(ds.dfs, sources, ds.marks, loaders.keys())
+        except ValueError as e:
+            ds.app.log('Snapshot not written: %s' % e)
+
+
+def settings_grid(settings: dict, grid: Optional[Dict[str, list]] = None) -> List[dict]:
+    """All combinations of the grid values, each combined with the base settings
+
+    :param settings: base settings
+    :param grid: setting key -> list of values
+    :return:
+    """
+    if not grid:
+        return [dict(settings)]
+    keys = list(grid.keys())
+    result = list()
+    for values in itertools.product(*(grid[k] for k in keys)):
+        s = dict(settings)
+        s.update(zip(keys, values))
+        result.append(s)
+    return result
+
+
+def module_settings(mod, settings: dict) -> dict:
+    """Settings of a task like in the GUI: the module defaults, overridden by settings.
+    Values are converted like values entered in the settings widget,
+    the kind of a setting is taken from the module default.
+
+    :param mod: analysis module
+    :param settings: settings from the file and the grid
+    :return:
+    """
+    defaults = {k: v for k, v in (getattr(mod, 'settings', None) or dict()).items() if v is not None}
+    result = dict()
+    for k, v in list(defaults.items()) + list(settings.items()):
+        kind = kind_of(defaults.get(k, v))
+        if v is not None:
+            try:
+                v = parse_setting(str(v), kind)
+            except ValueError:
+                raise ValueError('invalid %s value for setting %s: %s' % (kind, k, v))
+        result[k] = v
+    return result
+
+
+def _slug(s) -> str:
+    return re.sub(r'[^\w.-]+', '_', str(s)).strip('_')
+
+
+_batch_state = {'data_source': None, 'modules': dict(), 'verbose': True}
+"per process: data source loaded by the parent (inherited by fork) and loaded modules"
+
+
+def _get_module(path: str):
+    modules = _batch_state['modules']
+    if path not in modules:
+        modules[path] = load_module(path)
+    return modules[path]
+
+
+def _call(func, app: BatchApp, fig):
+    kwargs = dict(fig=fig, token=_Token(), progress=lambda p: None)
+    opts = getattr(func, 'ldaf_pool', None)
+    if not opts or opts.get('partitions') is None:
+        return call_analysis(func, app, **kwargs)
+    # functions decorated with run_in_pool: run the partitions one after another
+    n = opts['partitions']
+    parts = [call_analysis(func, app, partition=(i, n), **kwargs) for i in range(n)]
+    combine = opts.get('combine') or pd.concat
+    return combine(parts)
+
+
+def run_task(task: dict) -> dict:
+    """Run one analysis function and write its result
+
+    :param task: module path, function, settings, output path without extension, formats
+    :return: task summary with written files, logs and error
+    """
+    import matplotlib.pyplot as plt
+    from .Raster import Raster
+
+    t = time.perf_counter()
+    summary = {'module': task['module'], 'function': task['function'], 'settings': task['settings'],
+               'files': list(), 'error': None}
+    app = BatchApp(_batch_state['data_source'], task['settings'], _batch_state['verbose'])
+    fig = plt.figure(figsize=task['figsize'])
+    try:
+        func = _get_module(task['path']).functions[task['function']]
+        gg = _call(func, app, fig)
+        stem = task['output']
+        os.makedirs(os.path.dirname(stem), exist_ok=True)
+        if isinstance(gg, Raster):
+            gg.draw(fig)
+            gg = 'matplotlib'
+        if isinstance(gg, str) and gg == 'matplotlib':
+            for fmt in task['figure_formats']:
+                fig.savefig('%s.%s' % (stem, fmt), dpi=task['dpi'], bbox_inches='tight')
+                summary['files'].append('%s.%s' % (stem, fmt))
+        elif isinstance(gg, pd.DataFrame):
+            for fmt in task['table_formats']:
+                if fmt == 'parquet':
+                    gg.to_parquet(stem + '.parquet')
+                else:
+                    gg.to_csv(stem + '.csv')
+                summary['files'].append('%s.%s' % (stem, fmt))
+    except Exception as e:
+        summary['error'] = '%s: %s' % (type(e).__name__, e)
+    finally:
+        plt.close(fig)
+    summary['logs'] = app.logs
+    summary['elapsed'] = time.perf_counter() - t
+    return summary
+
+
+def make_tasks(modules_dir: str, settings: List[dict], output: str, modules: Optional[List[str]] = None,
+               functions: Optional[List[str]] = None, **options) -> List[dict]:
+    """Create one task per module function and settings combination
+
+    :param modules_dir: directory of analysis modules
+    :param settings: settings combinations, see settings_grid
+    :param output: output directory
+    :param modules: module file names or display names to run, default all
+    :param functions: function names to run, default all
+    :param options: figure_formats, table_formats, dpi, figsize
+    :return:
+    """
+    tasks = list()
+    for f in sorted(os.listdir(modules_dir)):
+        if not f.endswith('.py'):
+            continue
+        path = os.path.join(modules_dir, f)
+        mod = _get_module(path)
+        name = getattr(mod, 'name', f[:-3])
+        if modules and f not in modules and f[:-3] not in modules and name not in modules:
+            continue
+        for func_name in getattr(mod, 'functions', dict()):
+            if functions and func_name not in functions:
+                continue
+            for i, s in enumerate(settings):
+                stem = _slug(func_name)
+                if len(settings) > 1:
+                    stem += '__' + '_'.join('%s=%s' % (_slug(k), _slug(v)) for k, v in sorted(s.items())
+                                            if k in options.get('grid_keys', ()))
+                task = {'path': path, 'module': name, 'function': func_name,
+                        'settings': module_settings(mod, s),
+                        'output': os.path.join(output, _slug(name), stem)}
+                task.update(options)
+                tasks.append(task)
+    return tasks
+
+
+def run(data_source: DataSource, tasks: List[dict], workers: Optional[int] = None) -> List[dict]:
+    """Run tasks in worker processes forked after loading the data,
+    the workers share the loaded tables copy on write.
+    Without fork (eg. Windows) the tasks run in this process.
+
+    :param data_source: loaded data source
+    :param tasks: see make_tasks
+    :param workers: number of processes, default cpu count
+    :return: task summaries
+    """
+    _batch_state['data_source'] = data_source
+    workers = workers or os.cpu_count()
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [run_task(t) for t in tasks]
+    ctx = multiprocessing.get_context('fork')
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=ctx) as ex:
+        return list(ex.map(run_task, tasks))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='ldaf-batch', description='Run LDAF analysis modules without GUI')
+    parser.add_argument('data_source', help='DataSource file, path.py or path.py:ClassName')
+    parser.add_argument('modules_dir', help='directory of analysis modules')
+    parser.add_argument('-o', '--output', default='output', help='output directory')
+    parser.add_argument('-s', '--settings', help='JSON file: setting key -> value')
+    parser.add_argument('-g', '--grid', help='JSON file: setting key -> list of values')
+    parser.add_argument('-m', '--module', action='append', help='module to run (file or display name), repeatable')
+    parser.add_argument('-f', '--function', action='append', help='function to run, repeatable')
+    parser.add_argument('-j', '--workers', type=int, help='worker processes, default cpu count')
+    parser.add_argument('--figure-format', action='append', choices=['png', 'svg', 'pdf'],
+                        help='figure format, repeatable, default png')
+    parser.add_argument('--table-format', action='append', choices=['parquet', 'csv'],
+                        help='table format, repeatable, default parquet')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--size', type=float, nargs=2, default=(16, 9), metavar=('WIDTH', 'HEIGHT'),
+                        help='figure size in inches')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print log messages')
+    args = parser.parse_args(argv)
+
+    settings = dict()
+    if args.settings:
+        with open(args.settings) as f:
+            settings = json.load(f)
+    grid = None
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    _batch_state['verbose'] = not args.quiet
+    t = time.perf_counter()
+    data_source = load_data_source(args.data_source)
+    app = BatchApp(data_source, settings, not args.quiet)
+    load(data_source)
+    app.log('Data loaded in %.1f s' % (time.perf_counter() - t))
+
+    tasks = make_tasks(args.modules_dir, settings_grid(settings, grid), args.output, args.module, args.function,
+                       figure_formats=args.figure_format or ['png'], table_formats=args.table_format or ['parquet'],
+                       dpi=args.dpi, figsize=tuple(args.size), grid_keys=tuple((grid or {}).keys()))
+    results = run(data_source, tasks, args.workers)
+
+    failed = 0
+    for r in results:
+        if r['error'] is not None:
+            failed += 1
+            print('FAILED %s / %s: %s' % (r['module'], r['function'], r['error']), file=sys.stderr)
+        else:
+            print('%s / %s (%.1f s): %s' % (r['module'], r['function'], r['elapsed'], ', '.join(r['files']) or '-'))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .Snapshot import write_frame, read_frame
+
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+PARTIAL_AGGREGATIONS = {
+    'sum': ('sum',),
+    'count': ('count',),
+    'min': ('min',),
+    'max': ('max',),
+    'mean': ('sum', 'count'),
+}
+"aggregation -> partial aggregations computed per chunk"
+
+COMBINE = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+"partial aggregation -> aggregation combining the partial results of all chunks"
+
+
+class ChunkedTable(object):
+    """Out-of-core table stored as column files per chunk on disk.
+    Can be stored in DataSource.dfs instead of a DataFrame for tables larger than the RAM.
+    All operations work chunk by chunk, only one chunk is in memory at a time.
+    The data is materialized as DataFrame only by slice, head and to_frame.
+
+    Example::
+
+        table = ChunkedTable.write('data/example', pd.read_csv('example.csv', chunksize=1_000_000))
+        table.select(['x', 'y']).mean()
+        table.groupby_agg('key', {'price': 'mean', 'amount': 'sum'})
+
+    """
+    def __init__(self, directory: str, columns: Optional[List] = None):
+        """
+
+        :param directory: table directory written by ChunkedTable.write
+        :param columns: column projection, default all columns
+        """
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self._columns = columns
+        self._dtypes: Optional[pd.Series] = None
+        self.name = self.manifest.get('name')
+
+    @classmethod
+    def write(cls, directory: str, chunks: Iterable[pd.DataFrame], name: str = None) -> 'ChunkedTable':
+        """Write DataFrame chunks to directory, eg. from pd.read_csv(..., chunksize=n)
+
+        :param directory: table directory, replaced if it exists
+        :param chunks: DataFrames with the same columns
+        :param name: table name, set as name attribute of materialized DataFrames
+        :return:
+        """
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        rows = list()
+        columns = None
+        for i, chunk in enumerate(chunks):
+            if columns is None:
+                columns = list(chunk.columns)
+            elif list(chunk.columns) != columns:
+                raise ValueError('chunk %d has different columns' % i)
+            write_frame(chunk, os.path.join(directory, 'c%06d' % i))
+            rows.append(len(chunk))
+        manifest = {'columns': columns or list(), 'rows': rows, 'name': name}
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        return cls(directory)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, directory: str, chunk_rows: int = 1_000_000) -> 'ChunkedTable':
+        """Write DataFrame as chunked table
+
+        :param df: table
+        :param directory: table directory
+        :param chunk_rows: rows per chunk
+        :return:
+        """
+        chunks = (df.iloc[i:i + chunk_rows] for i in range(0, max(len(df), 1), chunk_rows))
+        return cls.write(directory, chunks, getattr(df, 'name', None))
+
+    @property
+    def columns(self) -> List:
+        """columns of the table or projection"""
+        return list(self.manifest['columns']) if self._columns is None else list(self._columns)
+
+    @property
+    def chunk_rows(self) -> List[int]:
+        """number of rows per chunk"""
+        return list(self.manifest['rows'])
+
+    @property
+    def shape(self) -> tuple:
+        """(rows, columns), without reading data"""
+        return sum(self.manifest['rows']), len(self.columns)
+
+    @property
+    def size(self) -> int:
+        """number of values"""
+        rows, cols = self.shape
+        return rows * cols
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """size of the column files on disk"""
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return total
+
+    @property
+    def dtypes(self) -> pd.Series:
+        """column dtypes, read from the first chunk"""
+        if self._dtypes is None:
+            first = next(self.iter_chunks(), None)
+            self._dtypes = pd.Series(dtype=object) if first is None else first.dtypes
+        return self._dtypes
+
+    def select(self, columns: List) -> 'ChunkedTable':
+        """Column projection, only these columns are read by all operations
+
+        :param columns: column names
+        :return:
+        """
+        missing = [c for c in columns if c not in self.manifest['columns']]
+        if missing:
+            raise KeyError(missing)
+        return ChunkedTable(self.directory, list(columns))
+
+    def __getitem__(self, columns) -> 'ChunkedTable':
+        if not isinstance(columns, list):
+            columns = [columns]
+        return self.select(columns)
+
+    def _chunk_dir(self, i: int) -> str:
+        return os.path.join(self.directory, 'c%06d' % i)
+
+    def iter_chunks(self, columns: Optional[List] = None) -> Iterator[pd.DataFrame]:
+        """Iterate chunks as memory-mapped DataFrames
+
+        :param columns: column projection, default columns of the table
+        :return:
+        """
+        columns = self.columns if columns is None else columns
+        for i in range(len(self.manifest['rows'])):
+            yield read_frame(self._chunk_dir(i), columns=columns)
+
+    def _reduce(self, func: str, combine: str, columns: Optional[List]) -> pd.Series:
+        partial = list()
+        for chunk in self.iter_chunks(columns):
+            if func == 'count':
+                partial.append(chunk.count())
+            elif func == 'sum':
+                partial.append(chunk.sum(numeric_only=True))
+            else:
+                partial.append(getattr(chunk.select_dtypes(include=['number', 'datetime']), func)())
+        return pd.DataFrame(partial).agg(combine)
+
+    def sum(self, columns: Optional[List] = None) -> pd.Series:
+        """Sum per numeric column
+
+        :param columns: column projection
+        :return:
+        """
+        return self._reduce('sum', 'sum', columns)
+
+    def min(self, columns: Optional[List] = None) -> pd.Series:
+        """Minimum per numeric column
+
+        :param columns: column projection
+        :return:
+        """
+        return self._reduce('min', 'min', columns)
+
+    def max(self, columns: Optional[List] = None) -> pd.Series:
+        """Maximum per numeric column
+
+        :param columns: column projection
+        :return:
+        """
+        return self._reduce('max', 'max', columns)
+
+    def count(self, columns: Optional[List] = None) -> pd.Series:
+        """Number of non null values per column
+
+        :param columns: column projection
+        :return:
+        """
+        return self._reduce('count', 'sum', columns)
+
+    def mean(self, columns: Optional[List] = None) -> pd.Series:
+        """Mean per numeric column
+
+        :param columns: column projection
+        :return:
+        """
+        s = self.sum(columns)
+        return s / self.count(columns)[s.index]
+
+    def groupby_agg(self, by: Union[str, List], agg: Dict[str, Union[str, List[str]]]) -> pd.DataFrame:
+        """Group by key columns and aggregate chunk by chunk.
+        Memory is bounded by the chunk size and the number of groups.
+
+        :param by: key column or list of key columns
+        :param agg: column -> aggregation or list of aggregations (sum, count, min, max, mean)
+        :return: DataFrame with one row per group, columns (column, aggregation)
+        """
+        keys = [by] if not isinstance(by, list) else by
+        agg = {col: [a] if isinstance(a, str) else list(a) for col, a in agg.items()}
+        partial = dict()
+        for col, aggs in agg.items():
+            for a in aggs:
+                if a not in PARTIAL_AGGREGATIONS:
+                    raise ValueError('unknown aggregation: %s' % a)
+            partial[col] = sorted({p for a in aggs for p in PARTIAL_AGGREGATIONS[a]})
+
+        columns = list(dict.fromkeys(keys + list(agg.keys())))
+        parts = [chunk.groupby(keys, observed=True, sort=False).agg(partial)
+                 for chunk in self.iter_chunks(columns)]
+        if not parts:
+            return pd.DataFrame()
+        combined = pd.concat(parts)
+        combined = combined.groupby(level=list(range(len(keys)))).agg(
+            {c: COMBINE[c[1]] for c in combined.columns})
+
+        result = dict()
+        for col, aggs in agg.items():
+            for a in aggs:
+                if a == 'mean':
+                    result[(col, a)] = combined[(col, 'sum')] / combined[(col, 'count')]
+                else:
+                    result[(col, a)] = combined[(col, a)]
+        return pd.DataFrame(result)
+
+    def slice(self, start: int, stop: int) -> pd.DataFrame:
+        """Materialize rows start:stop as DataFrame, only the chunks overlapping the rows are read
+
+        :param start: first row
+        :param stop: end row (exclusive)
+        :return:
+        """
+        rows = np.cumsum([0] + self.manifest['rows'])
+        start, stop, _ = slice(start, stop).indices(int(rows[-1]))
+        frames = list()
+        for i in range(len(self.manifest['rows'])):
+            if rows[i + 1] <= start or rows[i] >= stop:
+                continue
+            chunk = read_frame(self._chunk_dir(i), columns=self.columns)
+            frames.append(chunk.iloc[max(start - rows[i], 0):stop - rows[i]])
+        if not frames:
+            df = next(self.iter_chunks(), pd.DataFrame(columns=self.columns)).iloc[:0]
+        else:
+            # copy, the result must not reference the memory-mapped files
+            df = pd.concat(frames) if len(frames) > 1 else frames[0].copy()
+        if self.name is not None:
+            df.name = self.name
+        return df
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        """Materialize first n rows
+
+        :param n:
+        :return:
+        """
+        return self.slice(0, n)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Materialize the complete table (or projection), requires the table to fit into memory
+
+        :return:
+        """
+        return self.slice(0, len(self))
@@ -0,0 +1,321 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local data server: a long-lived process owns the DataSource tables and publishes them in shared memory.
+GUI sessions connect with RemoteDataSource over a Unix socket and map the tables without copying,
+several sessions share one copy and a restarted GUI reconnects without loading the data again.
+
+Start the server::
+
+    python -m ldaf.DataServer DataSource.py
+
+The socket is only accessible by the user running the server, by default it is placed in
+$XDG_RUNTIME_DIR or in a private directory in the temp directory, see default_socket_path.
+
+Protocol: one JSON object per line, request {"cmd": ...}, response {...} or {"error": ...}.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from .DataSource import DataSource
+from .SharedTables import SharedTables, attach_tables, detach
+
+from typing import List, Optional
+
+SOCKET_NAME = 'ldaf.sock'
+
+
+def default_socket_path() -> str:
+    """Socket in $XDG_RUNTIME_DIR, or in the directory ldaf-<uid> in the temp directory,
+    which is created with mode 0700 and must be owned by the user
+
+    :return:
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    directory = os.path.join(tempfile.gettempdir(), 'ldaf-%d' % os.getuid())
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('%s is not a private directory of the current user' % directory)
+    return os.path.join(directory, SOCKET_NAME)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.data_server.handle(json.loads(line))
+            except Exception as e:
+                response = {'error': '%s: %s' % (type(e).__name__, e)}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DataServer(object):
+    """Owns a DataSource and publishes its tables in shared memory
+
+    """
+    def __init__(self, data_source: DataSource, socket_path: Optional[str] = None):
+        """
+
+        :param data_source:
+        :param socket_path: None for default_socket_path()
+        """
+        self.data_source = data_source
+        self.socket_path = socket_path or default_socket_path()
+        self.tables = SharedTables()
+        self.generation = 0
+        "incremented whenever the tables are published again"
+
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+
+    def log(self, msg):
+        print(msg, file=sys.stderr)
+
+    def load(self):
+        """Load all tables and publish them
+
+        :return:
+        """
+        from .Batch import load
+        t = time.perf_counter()
+        load(self.data_source)
+        self.log('Data loaded in %.1f s' % (time.perf_counter() - t))
+        self.publish()
+
+    def publish(self):
+        """Place tables in shared memory, blocks of the previous generation are unlinked,
+        clients still mapping them keep their memory until they detach
+
+        :return:
+        """
+        self.tables.publish(self.data_source.dfs)
+        self.generation += 1
+        self.log('Published %d tables, generation %d' % (len(self.tables.descriptor), self.generation))
+
+    def state(self) -> dict:
+        return {
+            'generation': self.generation,
+            'versions': self.data_source.versions,
+            'descriptor': self.tables.descriptor,
+        }
+
+    def handle(self, request: dict) -> dict:
+        """Handle client request
+
+        :param request: {"cmd": "ping" | "tables" | "reload" | "refresh" | "shutdown"}
+        :return: response
+        """
+        cmd = request.get('cmd')
+        with self._lock:
+            if cmd == 'ping':
+                return {'generation': self.generation}
+            if cmd == 'tables':
+                return self.state()
+            if cmd == 'reload':
+                self.load()
+                return self.state()
+            if cmd == 'refresh':
+                changed = self.data_source.refresh()
+                if changed:
+                    self.publish()
+                return dict(self.state(), changed=changed)
+            if cmd == 'shutdown':
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                return {}
+        raise ValueError('unknown command: %s' % cmd)
+
+    def _remove_stale_socket(self):
+        """Remove the socket file of a server which is not running anymore
+
+        :return:
+        """
+        try:
+            st = os.lstat(self.socket_path)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(st.st_mode):
+            raise FileExistsError('%s exists and is not a socket' % self.socket_path)
+        try:
+            request(self.socket_path, 'ping', timeout=5)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        raise RuntimeError('a data server is already listening on %s' % self.socket_path)
+
+    def serve_forever(self):
+        """Listen on the Unix socket until shutdown, the socket is only accessible by the current user
+
+        :return:
+        """
+        self._remove_stale_socket()
+        umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self._server.data_server = self
+        self.log('Listening on %s' % self.socket_path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.tables.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def request(socket_path: str, cmd: str, timeout: Optional[float] = None) -> dict:
+    """Send request to the data server
+
+    :param socket_path: Unix socket of the server
+    :param cmd: command
+    :param timeout: seconds, None to wait (reload can take long)
+    :return: response
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        if hasattr(socket, 'SO_PEERCRED'):
+            cred = s.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            pid, uid, gid = struct.unpack('3i', cred)
+            if uid != os.getuid():
+                raise PermissionError('data server on %s is run by another user (uid %d)' % (socket_path, uid))
+        s.sendall((json.dumps({'cmd': cmd}) + '\n').encode())
+        with s.makefile('rb') as f:
+            response = json.loads(f.readline())
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response
+
+
+class RemoteDataSource(DataSource):
+    """DataSource whose tables are owned by a DataServer.
+    The tables are read only views on shared memory, copy them before modifying.
+
+    Example::
+
+        window = App(app, RemoteDataSource(), modules_dir, settings)
+
+    """
+    def __init__(self, socket_path: Optional[str] = None):
+        """
+
+        :param socket_path: None for default_socket_path()
+        """
+        super().__init__()
+        self.socket_path = socket_path or default_socket_path()
+        self.generation = None
+        self._blocks: list = list()
+
+    def _attach(self, state: dict):
+        if state['generation'] == self.generation:
+            return
+        dfs, blocks = attach_tables(state['descriptor'], untrack=True)
+        for name, df in dfs.items():
+            df.name = name
+        old = self._blocks
+        self.dfs = dfs
+        self._blocks = blocks
+        self.versions = dict(state['versions'])
+        self.generation = state['generation']
+        detach(old)
+
+    def load_data(self):
+        """Map the tables published by the server
+
+        :return:
+        """
+        self._attach(request(self.socket_path, 'tables'))
+
+    def reload_server(self):
+        """Let the server load the data again, then map the new tables
+
+        :return:
+        """
+        self._attach(request(self.socket_path, 'reload'))
+
+    def refresh(self) -> List[str]:
+        """Let the server append new rows, then map the new tables
+
+        :return: names of changed tables
+        """
+        state = request(self.socket_path, 'refresh')
+        self._attach(state)
+        return state['changed']
+
+    def on_tab_change(self, i=0):
+        pass
+
+    def get_loaded_tables(self) -> list:
+        return list(self.dfs.keys())
+
+    def get_table_shape(self, table: str) -> tuple:
+        return self.dfs[table].shape
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='ldaf-server', description='Serve LDAF tables in shared memory')
+    parser.add_argument('data_source', help='DataSource file, path.py or path.py:ClassName')
+    parser.add_argument('--socket', help='Unix socket path, default $XDG_RUNTIME_DIR/ldaf.sock')
+    parser.add_argument('-s', '--settings', help='JSON file: setting key -> value, for the DataSource')
+    args = parser.parse_args(argv)
+
+    from .Batch import BatchApp, load_data_source
+    settings = dict()
+    if args.settings:
+        with open(args.settings) as f:
+            settings = json.load(f)
+    data_source = load_data_source(args.data_source)
+    BatchApp(data_source, settings)
+    server = DataServer(data_source, args.socket)
+    server.load()
+    signal.signal(signal.SIGTERM, lambda *a: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,21 +14,100 @@
 # You should have received a copy of the GNU General Public License
 # along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
 
-import pandas as pd
+import concurrent.futures
+import threading
+import time
+
+from . import helper
 
 import typing
 if typing.TYPE_CHECKING:
+    # imported on first use, so the main window is shown before pandas is loaded
+    import pandas as pd
+    from .Snapshot import Snapshot
+    from .AppendBuffer import AppendBuffer
+    from .DerivedTable import DerivedTable
     from .App import App
 
 
+def timed_load(loader: typing.Callable) -> typing.Tuple['pd.DataFrame', float]:
+    """Run table loader and measure its duration
+
+    :param loader: callable returning the table
+    :return: table, elapsed seconds
+    """
+    t = time.perf_counter()
+    df = loader()
+    return df, time.perf_counter() - t
+
+
+def table_nbytes(df) -> typing.Optional[int]:
+    """Memory of a DataFrame (without deep inspection of objects), disk size of a ChunkedTable
+
+    :param df: table
+    :return: bytes, None for unknown table types
+    """
+    import pandas as pd
+    if isinstance(df, pd.DataFrame):
+        return int(df.memory_usage(index=True).sum())
+    return getattr(df, 'nbytes', None)
+
+
 class DataSource(object):
     """Class to store all Data
 
     """
+    loader_workers: typing.Optional[int] = None
+    "number of tables loaded concurrently, default: number of loaders"
+
+    loader_processes: bool = False
+    "run loaders in processes instead of threads, loaders must be picklable (module level functions)"
+
+    snapshot_dir: typing.Optional[str] = None
+    "directory of the on-disk snapshot of all tables, None to disable, requires get_source_files"
+
+    optimize_dtypes: typing.Union[bool, dict] = False
+    "True: convert all tables to compact dtypes after loading, dict: table name -> options (see Dtypes.DEFAULTS)"
+
+    memory_budget: typing.Optional[int] = None
+    "memory budget in bytes for loaded tables, least recently used tables are spilled to disk, None for no limit"
+
+    spill_dir: typing.Optional[str] = None
+    "directory for spilled tables, default a temporary directory"
+
+    time_columns: typing.Dict[str, str] = dict()
+    "table name -> time column, default 'time'"
+
     def __init__(self):
-        self.dfs = dict()
+        if self.memory_budget is None:
+            self.dfs = dict()
+        else:
+            from .TableStore import TableStore
+            self.dfs = TableStore(self.memory_budget, self.spill_dir)
         self.args = dict()
         self.tables = list()
+        self.versions = dict()
+        "table name -> version counter, incremented whenever the table changes"
+
+        self.marks = dict()
+        "table name -> high-water mark (eg. file offset or max timestamp), tables with a mark can be refreshed"
+
+        self.buffers: typing.Dict[str, typing.Tuple['AppendBuffer', 'pd.DataFrame']] = dict()
+        "table name -> append buffer and the table it returned last"
+
+        self.derived: typing.Dict[str, 'DerivedTable'] = dict()
+        "derived table name -> DerivedTable, see register_derived"
+
+        self._derived_lock = threading.RLock()
+
+        self.index_specs: typing.Dict[str, typing.Dict[str, str]] = dict()
+        "table name -> column -> index kind ('hash' or 'sorted'), see declare_index"
+
+        self.indexes: typing.Dict[tuple, tuple] = dict()
+        "(table, column) -> (table version, index)"
+
+        self.load_stats = dict()
+        "table name -> dict with bytes, elapsed load time and deep memory (memory_before, memory)"
 
         self.app: 'App' = None
         "reference to QT Application, will be initialised by App"
@@ -39,6 +118,148 @@ class DataSource(object):
         """
         raise NotImplementedError
 
+    def get_loaders(self) -> typing.Dict[str, typing.Callable[[], 'pd.DataFrame']]:
+        """Optional: declare independent loaders per table.
+        The tables are loaded concurrently and are usable as soon as they are loaded.
+        If no loaders are returned, load_data is used.
+
+        :return: dict table name -> callable returning the table
+        """
+        return dict()
+
+    def on_table_loaded(self, name: str, df: 'pd.DataFrame', elapsed: float):
+        """Store table returned by a loader
+
+        :param name: table name
+        :param df: table
+        :param elapsed: load time in seconds
+        :return:
+        """
+        self.set_table(name, df)
+        self.load_stats.setdefault(name, dict()).update(bytes=table_nbytes(df), elapsed=elapsed)
+
+    def optimize_table(self, name: str, df: 'pd.DataFrame') -> 'pd.DataFrame':
+        """Convert table to compact dtypes according to optimize_dtypes,
+        records the deep memory before and after in load_stats
+
+        :param name: table name
+        :param df: table
+        :return: converted table
+        """
+        import pandas as pd
+        from . import Dtypes
+        options = self.optimize_dtypes
+        if isinstance(options, dict):
+            options = options.get(name, False)
+        if options is False or not isinstance(df, pd.DataFrame):
+            return df
+        before = Dtypes.deep_memory(df)
+        df = Dtypes.optimize(df, options if isinstance(options, dict) else None)
+        after = Dtypes.deep_memory(df)
+        self.load_stats.setdefault(name, dict()).update(memory_before=before, memory=after)
+        if self.app is not None:
+            self.app.log('Table %s: memory %s -> %s' % (name, helper.format_bytes(before), helper.format_bytes(after)))
+        return df
+
+    def optimize_tables(self):
+        """Convert all loaded tables to compact dtypes, see optimize_dtypes
+
+        :return:
+        """
+        for name in list(self.dfs.keys()):
+            self.dfs[name] = self.optimize_table(name, self.dfs[name])
+
+    def get_source_files(self) -> typing.List[str]:
+        """Optional: files the tables are loaded from.
+        The snapshot is used instead of loading the data as long as these files do not change.
+
+        :return: list of paths
+        """
+        return list()
+
+    def get_snapshot(self) -> typing.Optional['Snapshot']:
+        """Return snapshot if enabled
+
+        :return:
+        """
+        from .Snapshot import Snapshot
+        if self.snapshot_dir is None or not self.get_source_files():
+            return None
+        return Snapshot(self.snapshot_dir)
+
+    def source_fingerprint(self) -> typing.List[list]:
+        """Path, size and modification time of the source files
+
+        :return:
+        """
+        from .Snapshot import fingerprint
+        return fingerprint(self.get_source_files())
+
+    def load_snapshot(self, snapshot: 'Snapshot'):
+        """Memory-map all tables of the snapshot instead of loading the data.
+        Pages are read from disk when the columns are used.
+        Tables which are not stored in the snapshot (see Snapshot.skipped) are loaded with their loader.
+
+        :param snapshot:
+        :return:
+        """
+        for name in snapshot.tables():
+            df, elapsed = timed_load(lambda: snapshot.load_table(name))
+            self.on_table_loaded(name, df, elapsed)
+        skipped = snapshot.skipped()
+        if skipped:
+            loaders = self.get_loaders()
+            for name in skipped:
+                df, elapsed = timed_load(loaders[name])
+                self.on_table_loaded(name, self.optimize_table(name, df), elapsed)
+        # refresh data continues from the state of the snapshot
+        self.marks.update(snapshot.marks())
+
+    def read_new_rows(self, table: str, mark) -> typing.Tuple[typing.Optional['pd.DataFrame'], typing.Any]:
+        """Optional: read rows added to the source since the high-water mark,
+        eg. with helper.read_csv_tail. Used by refresh data for all tables in self.marks.
+        The new rows must have the same columns as the table.
+
+        :param table: table name
+        :param mark: high-water mark of the last read
+        :return: new rows (None or empty if there are none), new mark
+        """
+        raise NotImplementedError
+
+    def append_rows(self, name: str, df: 'pd.DataFrame'):
+        """Append rows to table in amortized O(new rows), increments the table version
+
+        :param name: table name
+        :param df: new rows
+        :return:
+        """
+        from .AppendBuffer import AppendBuffer
+        current = self.dfs[name]
+        buf, frame = self.buffers.get(name, (None, None))
+        if frame is not current:
+            # table was loaded or replaced since the last append
+            buf = AppendBuffer(current)
+        buf.append(df)
+        frame = buf.frame()
+        self.buffers[name] = (buf, frame)
+        self.set_table(name, frame)
+        if name in self.load_stats:
+            self.load_stats[name]['bytes'] = table_nbytes(frame)
+
+    def refresh(self) -> typing.List[str]:
+        """Append new rows of all tables with a high-water mark
+
+        :return: names of changed tables
+        """
+        changed = list()
+        for name, mark in list(self.marks.items()):
+            df, mark = self.read_new_rows(name, mark)
+            if df is not None and len(df):
+                self.append_rows(name, df)
+                changed.append(name)
+            self.marks[name] = mark
+        return changed
+
     def on_tab_change(self, i=0):
         """Callback when Analyzer Tab as been changed.
         Use eg. to update settings, statistics, ...
@@ -61,12 +282,197 @@ class DataSource(object):
         """
         raise NotImplementedError
 
-    def get_table(self, name: str) -> pd.DataFrame:
-        """get loaded table by name, eg DataFrame
+    def get_table(self, name: str) -> 'pd.DataFrame':
+        """get loaded table by name, eg DataFrame or ChunkedTable for tables larger than the RAM.
+        Derived tables are computed if they are stale.
 
         """
+        if name in self.derived:
+            return self._get_derived(name)
         return self.dfs[name]
 
+    def register_derived(self, name: str, func: typing.Callable, inputs: typing.List[str],
+                         settings: typing.List[str] = ()):
+        """Declare a table computed from input tables and settings.
+        It is computed on first get_table and cached in dfs, it is computed again only if an input table
+        or one of the settings changed. Inputs can be derived tables as well.
+
+        Example::
+
+            def joined(tables, settings):
+                return tables['trades'].merge(tables['quotes'], on='id')
+
+            self.register_derived('joined', joined, ['trades', 'quotes'])
+
+        :param name: table name
+        :param func: func(tables, settings) -> DataFrame, tables: input name -> table, settings: key -> value
+        :param inputs: input table names
+        :param settings: settings keys used by func
+        :return:
+        """
+        from .DerivedTable import DerivedTable
+        self.derived[name] = DerivedTable(name, func, inputs, settings)
+
+    def _get_derived(self, name: str) -> 'pd.DataFrame':
+        derived = self.derived[name]
+        with self._derived_lock:
+            # pull inputs first, stale derived inputs are computed and get a new version
+            tables = {i: self.get_table(i) for i in derived.inputs}
+            settings = {k: self.app.settings.get(k) if self.app is not None else None for k in derived.settings}
+            key = derived.make_key(self.versions, settings)
+            if not derived.is_stale(key) and name in self.dfs:
+                return self.dfs[name]
+            df, elapsed = timed_load(lambda: derived.compute(tables, settings, key))
+            self.on_table_loaded(name, df, elapsed)
+        if self.app is not None:
+            self.app.log('Derived table %s computed in %.1f s' % (name, elapsed))
+            self.app.notify_table_changed(name)
+        return df
+
+    def declare_index(self, table: str, column: str, kind: str = 'hash'):
+        """Declare secondary index on a column, built in the background after loading.
+        hash: equality lookups, sorted: equality and range lookups
+
+        :param table: table name
+        :param column: column name
+        :param kind: 'hash' or 'sorted'
+        :return:
+        """
+        from .TableIndex import INDEX_TYPES
+        if kind not in INDEX_TYPES:
+            raise ValueError('unknown index kind: %s' % kind)
+        self.index_specs.setdefault(table, dict())[column] = kind
+
+    def _build_index(self, table: str, column: str):
+        from .TableIndex import INDEX_TYPES
+        if table in self.derived:
+            # compute stale derived table first
+            self.get_table(table)
+        # set_table stores the table before the version is incremented,
+        # read in reverse order an index is never marked newer than its data
+        version = self.versions.get(table)
+        df = self.dfs[table]
+        index = INDEX_TYPES[self.index_specs[table][column]](df[column])
+        self.indexes[(table, column)] = (version, index)
+        return index
+
+    def build_indexes(self, tables: typing.Optional[list] = None, workers: typing.Optional[int] = None) -> list:
+        """Build all declared indexes which are missing or out of date, in parallel threads
+
+        :param tables: table names, default all tables with declared indexes
+        :param workers: number of threads, default number of indexes
+        :return: list of (table, column) built
+        """
+        todo = [(t, c) for t, columns in self.index_specs.items() if tables is None or t in tables
+                for c in columns if t in self.dfs or t in self.derived]
+        todo = [k for k in todo if self.indexes.get(k, (None,))[0] != self.versions.get(k[0])]
+        if not todo:
+            return todo
+        with concurrent.futures.ThreadPoolExecutor(workers or len(todo), thread_name_prefix='ldaf-index') as ex:
+            for f in [ex.submit(self._build_index, t, c) for t, c in todo]:
+                f.result()
+        return todo
+
+    def get_index(self, table: str, column: str):
+        """Return index of column, built now if it is missing or the table changed since it was built
+
+        :param table: table name
+        :param column: column name
+        :return: HashIndex or SortedIndex
+        """
+        if column not in self.index_specs.get(table, dict()):
+            raise KeyError('no index declared on %s.%s' % (table, column))
+        version, index = self.indexes.get((table, column), (None, None))
+        if index is None or version != self.versions.get(table):
+            index = self._build_index(table, column)
+        return index
+
+    def lookup(self, table: str, column: str, value) -> 'pd.DataFrame':
+        """Rows with column == value using the index of the column
+
+        :param table: table name
+        :param column: indexed column
+        :param value:
+        :return:
+        """
+        index = self.get_index(table, column)
+        return self.get_table(table).iloc[index.lookup(value)]
+
+    def lookup_range(self, table: str, column: str, lo=None, hi=None, closed: str = 'both') -> 'pd.DataFrame':
+        """Rows with lo <= column <= hi using the sorted index of the column
+
+        :param table: table name
+        :param column: column with sorted index
+        :param lo: lower bound, None for unbounded
+        :param hi: upper bound, None for unbounded
+        :param closed: 'both', 'left', 'right' or 'neither'
+        :return:
+        """
+        index = self.get_index(table, column)
+        if not hasattr(index, 'lookup_range'):
+            raise TypeError('range lookups require a sorted index on %s.%s' % (table, column))
+        return self.get_table(table).iloc[index.lookup_range(lo, hi, closed)]
+
+    def time_column(self, table: str) -> str:
+        """Name of the time column of table
+
+        :param table: table name
+        :return:
+        """
+        return self.time_columns.get(table, 'time')
+
+    def time_range(self, table: str) -> tuple:
+        """Cached (min, max) of the time column of table
+
+        :param table: table name
+        :return:
+        """
+        from .TimeIndex import get_time_index
+        index = get_time_index(self.get_table(table), self.time_column(table))
+        return index.min, index.max
+
+    def time_window(self, table: str, t0=None, t1=None, closed: str = 'left') -> 'pd.DataFrame':
+        """Rows of table with t0 <= time < t1 by binary search on the time column.
+        If the time column is sorted, the result is a view on the table.
+
+        :param table: table name
+        :param t0: start, None for unbounded
+        :param t1: end, None for unbounded
+        :param closed: 'left' (default), 'right', 'both' or 'neither'
+        :return:
+        """
+        from .TimeIndex import time_window
+        return time_window(self.get_table(table), t0, t1, self.time_column(table), closed)
+
+    def cache_versions(self) -> dict:
+        """Table versions without derived tables, derived tables are determined by their inputs and settings.
+        Used for cache keys.
+
+        :return:
+        """
+        return {k: v for k, v in self.versions.items() if k not in self.derived}
+
+    def set_table(self, name: str, df: 'pd.DataFrame'):
+        """store table and increment its version
+
+        :param name: table name
+        :param df: table
+        :return:
+        """
+        self.dfs[name] = df
+        self.bump_version(name)
+
+    def bump_version(self, name: str = None):
+        """Mark table as changed, invalidates cached results using it.
+        Call after modifying a table in place.
+
+        :param name: table name, None for all loaded tables
+        :return:
+        """
+        names = list(self.dfs.keys()) if name is None else [name]
+        for n in names:
+            self.versions[n] = self.versions.get(n, 0) + 1
+
     def info(self):
         """Print statistics about loaded tables on stdout
 
@@ -0,0 +1,191 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import matplotlib.dates
+
+from typing import Tuple
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_bins: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Decimate series to min and max value per bin (pixel column).
+    Peaks are preserved exactly.
+
+    :param x: sorted x values
+    :param y: y values
+    :param n_bins: number of bins, eg. axes width in pixel
+    :return: decimated x, y
+    """
+    n = len(x)
+    if n <= 2 * n_bins:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], n_bins + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side='left'))
+    starts = starts[starts < n]
+    ends = np.append(starts[1:], n) - 1
+
+    y_out = np.empty(2 * len(starts), dtype=y.dtype)
+    y_out[0::2] = np.fmin.reduceat(y, starts)
+    y_out[1::2] = np.fmax.reduceat(y, starts)
+    x_out = np.empty(2 * len(starts), dtype=x.dtype)
+    x_out[0::2] = x[starts]
+    x_out[1::2] = x[ends]
+    return x_out, y_out
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets decimation,
+    keeps the visual shape of the series with n_out points.
+
+    :param x: sorted x values
+    :param y: y values
+    :param n_out: number of output points
+    :return: decimated x, y
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.intp) + 1
+    edges[-1] = n - 1
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i < n_out - 3:
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.)))
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+
+class DecimatedLine(object):
+    """Line which only draws a decimated version of the visible part of the series.
+    The full arrays are kept and decimated again when the x limits change,
+    so at most about two points per pixel column are drawn.
+
+    """
+    min_bins = 500
+    "minimum number of bins, used before the axes has been laid out"
+
+    def __init__(self, ax, x, y, method: str = 'minmax', **kwargs):
+        """
+
+        :param ax: matplotlib Axes
+        :param x: x values, datetime64 is converted to matplotlib dates
+        :param y: y values
+        :param method: 'minmax' or 'lttb'
+        :param kwargs: Line2D properties, eg. color, marker
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        if x.dtype.kind == 'M':
+            x = matplotlib.dates.date2num(x)
+            ax.xaxis_date()
+        if len(x) > 1 and np.any(x[1:] < x[:-1]):
+            order = np.argsort(x, kind='stable')
+            x = x[order]
+            y = y[order]
+
+        self.ax = ax
+        self.x = x
+        self.y = y
+        if method not in ('minmax', 'lttb'):
+            raise ValueError('unknown decimation method: %s' % method)
+        self.method = method
+        self._xlim = None
+
+        self.line, = ax.plot(*self._decimated(), **kwargs)
+        self.line.ldaf_adaptive = self
+        "keep decimator alive, matplotlib only stores weak references to callbacks"
+
+        if len(x):
+            ax.update_datalim([[x[0], np.nanmin(y)], [x[-1], np.nanmax(y)]])
+            ax.autoscale_view()
+        self.connect()
+
+    @property
+    def nbytes(self) -> int:
+        """memory of the full arrays"""
+        return self.x.nbytes + self.y.nbytes
+
+    def connect(self):
+        """Connect to the axes limit callbacks
+
+        :return:
+        """
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+    def _decimated(self, x0=None, x1=None):
+        lo = 0 if x0 is None else max(np.searchsorted(self.x, x0, side='left') - 1, 0)
+        hi = len(self.x) if x1 is None else np.searchsorted(self.x, x1, side='right') + 1
+        width = max(int(self.ax.bbox.width), self.min_bins)
+        if self.method == 'lttb':
+            return lttb(self.x[lo:hi], self.y[lo:hi], 2 * width)
+        return minmax(self.x[lo:hi], self.y[lo:hi], width)
+
+    def on_xlim_changed(self, ax):
+        """Matplotlib callback, decimate visible range
+
+        :param ax:
+        :return:
+        """
+        xlim = ax.get_xlim()
+        if xlim == self._xlim:
+            return
+        self._xlim = xlim
+        self.line.set_data(*self._decimated(*sorted(xlim)))
+
+
+def connect_adaptive(fig):
+    """Reconnect view dependent artists (eg. DecimatedLine) of an unpickled figure.
+    Matplotlib does not pickle callbacks.
+
+    :param fig: matplotlib Figure
+    :return:
+    """
+    for artist in fig.findobj(lambda a: hasattr(a, 'ldaf_adaptive')):
+        artist.ldaf_adaptive.connect()
+
+
+def adaptive_nbytes(fig) -> int:
+    """Memory of the data kept by view dependent artists of a figure
+
+    :param fig: matplotlib Figure
+    :return:
+    """
+    return sum(a.ldaf_adaptive.nbytes for a in fig.findobj(lambda a: hasattr(a, 'ldaf_adaptive')))
+
+
+def plot(ax, x, y, method: str = 'minmax', **kwargs):
+    """Plot large series with zoom aware decimation.
+    Use instead of ax.plot(x, y), eg. for time series with millions of points.
+
+    :param ax: matplotlib Axes
+    :param x: x values
+    :param y: y values
+    :param method: 'minmax' (exact peaks) or 'lttb' (shape preserving)
+    :param kwargs: Line2D properties
+    :return: Line2D
+    """
+    return DecimatedLine(ax, x, y, method, **kwargs).line
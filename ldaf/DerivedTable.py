@@ -0,0 +1,74 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import pandas as pd
+
+from typing import Callable, Dict, List, Optional
+
+
+class DerivedTable(object):
+    """Table computed from input tables and settings, see DataSource.register_derived.
+    The table is computed on first access and again only after an input table
+    (version) or one of the settings changed.
+
+    """
+    def __init__(self, name: str, func: Callable[[Dict[str, pd.DataFrame], dict], pd.DataFrame],
+                 inputs: List[str], settings: List[str] = ()):
+        """
+
+        :param name: table name
+        :param func: func(tables, settings) -> DataFrame, tables: input name -> table, settings: key -> value
+        :param inputs: names of input tables, base or derived tables
+        :param settings: settings keys the table depends on
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.settings = list(settings)
+        self.key: Optional[tuple] = None
+        "input versions and settings values of the last computation"
+
+    def make_key(self, versions: dict, settings: dict) -> tuple:
+        """Dependency state
+
+        :param versions: table name -> version, of the up to date input tables
+        :param settings: settings key -> value
+        :return:
+        """
+        return (tuple(versions.get(name) for name in self.inputs),
+                tuple(repr(settings.get(key)) for key in self.settings))
+
+    def is_stale(self, key: tuple) -> bool:
+        """True if not computed yet or computed from other inputs
+
+        :param key: current dependency state, see make_key
+        :return:
+        """
+        return self.key != key
+
+    def compute(self, tables: Dict[str, pd.DataFrame], settings: dict, key: tuple) -> pd.DataFrame:
+        """Compute table
+
+        :param tables: input name -> table
+        :param settings: settings key -> value
+        :param key: dependency state, see make_key
+        :return:
+        """
+        df = self.func(tables, settings)
+        if isinstance(df, pd.DataFrame) and getattr(df, 'name', None) is None:
+            df.name = self.name
+        self.key = key
+        return df
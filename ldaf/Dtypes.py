@@ -0,0 +1,160 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Reduce memory of loaded tables: downcast numeric columns,
+encode low cardinality string columns as category and parse time columns.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from typing import Optional
+
+DEFAULTS = {
+    # downcast int64 to the smallest signed integer type holding all values
+    'integers': True,
+    # downcast float64 to float32 if all values are represented exactly
+    'floats': True,
+    # encode string columns as category if distinct values / rows is at most this ratio, None to disable
+    'category_ratio': 0.5,
+    # parse string columns with matching names (case insensitive) as ISO 8601 datetime, None to disable
+    'time_pattern': r'(^|_)(time|date|datetime|timestamp)($|_)',
+    # column -> 'skip', 'category', 'datetime' or dtype, overrides the automatic conversion
+    'columns': {},
+}
+"options of optimize"
+
+
+def _is_string(s: pd.Series) -> bool:
+    return s.dtype == object or isinstance(s.dtype, pd.StringDtype)
+
+
+def downcast_integer(s: pd.Series) -> pd.Series:
+    """Downcast to the smallest signed integer type holding all values
+
+    :param s: integer column
+    :return:
+    """
+    if len(s) == 0:
+        return s
+    lo, hi = s.min(), s.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return s.astype(dtype) if np.dtype(dtype).itemsize < s.dtype.itemsize else s
+    return s
+
+
+def downcast_float(s: pd.Series) -> pd.Series:
+    """Downcast float64 to float32 if all values round-trip exactly
+
+    :param s: float column
+    :return:
+    """
+    if s.dtype != np.float64:
+        return s
+    values = s.to_numpy()
+    small = values.astype(np.float32)
+    if np.array_equal(small.astype(np.float64), values, equal_nan=True):
+        return pd.Series(small, index=s.index, name=s.name)
+    return s
+
+
+def to_category(s: pd.Series, ratio: float) -> pd.Series:
+    """Encode as category if the number of distinct values is low
+
+    :param s: string column
+    :param ratio: maximum distinct values / rows
+    :return:
+    """
+    if len(s) == 0 or s.nunique(dropna=True) > ratio * len(s):
+        return s
+    return s.astype('category')
+
+
+def parse_time(s: pd.Series) -> pd.Series:
+    """Parse string column as ISO 8601 datetime, unchanged if not all values can be parsed.
+    Other formats are not guessed, convert them with options['columns'].
+
+    :param s: string column
+    :return:
+    """
+    try:
+        return pd.to_datetime(s, format='ISO8601')
+    except (ValueError, TypeError):
+        return s
+
+
+def optimize_column(s: pd.Series, options: dict) -> pd.Series:
+    """Convert column to a more compact dtype
+
+    :param s: column
+    :param options: see DEFAULTS
+    :return: converted or unchanged column
+    """
+    conversion = options['columns'].get(s.name)
+    if conversion == 'skip':
+        return s
+    if conversion == 'category':
+        return s.astype('category')
+    if conversion == 'datetime':
+        return pd.to_datetime(s)
+    if conversion is not None:
+        return s.astype(conversion)
+
+    kind = s.dtype.kind if isinstance(s.dtype, np.dtype) else None
+    if kind == 'i' and options['integers']:
+        return downcast_integer(s)
+    if kind == 'f' and options['floats']:
+        return downcast_float(s)
+    if _is_string(s):
+        pattern = options['time_pattern']
+        if pattern is not None and isinstance(s.name, str) and re.search(pattern, s.name, re.IGNORECASE):
+            parsed = parse_time(s)
+            if parsed is not s:
+                return parsed
+        if options['category_ratio'] is not None:
+            return to_category(s, options['category_ratio'])
+    return s
+
+
+def optimize(df: pd.DataFrame, options: Optional[dict] = None) -> pd.DataFrame:
+    """Convert all columns of a table to compact dtypes
+
+    :param df: table
+    :param options: overrides of DEFAULTS
+    :return: new DataFrame, the name attribute is kept
+    """
+    if not df.columns.is_unique:
+        return df
+    opts = dict(DEFAULTS)
+    opts.update(options or {})
+    data = {col: optimize_column(df.iloc[:, i], opts) for i, col in enumerate(df.columns)}
+    result = pd.DataFrame(data, index=df.index, copy=False)
+    if getattr(df, 'name', None) is not None:
+        result.name = df.name
+    return result
+
+
+def deep_memory(df: pd.DataFrame) -> int:
+    """Memory of table including the content of object columns
+
+    :param df:
+    :return: bytes
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -53,7 +53,7 @@ class Ui_MainWindow(object):
         sizePolicy.setHeightForWidth(self.loadedTables.sizePolicy().hasHeightForWidth())
         self.loadedTables.setSizePolicy(sizePolicy)
         self.loadedTables.setObjectName("loadedTables")
-        self.loadedTables.setColumnCount(3)
+        self.loadedTables.setColumnCount(7)
         self.loadedTables.setRowCount(0)
         item = QtWidgets.QTableWidgetItem()
         self.loadedTables.setHorizontalHeaderItem(0, item)
@@ -61,6 +61,14 @@ class Ui_MainWindow(object):
         self.loadedTables.setHorizontalHeaderItem(1, item)
         item = QtWidgets.QTableWidgetItem()
         self.loadedTables.setHorizontalHeaderItem(2, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.loadedTables.setHorizontalHeaderItem(3, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.loadedTables.setHorizontalHeaderItem(4, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.loadedTables.setHorizontalHeaderItem(5, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.loadedTables.setHorizontalHeaderItem(6, item)
         self.loadedTables.verticalHeader().setVisible(False)
         self.verticalLayout.addWidget(self.loadedTables)
         self.label = QtWidgets.QLabel(self.centralwidget)
@@ -85,17 +93,35 @@ class Ui_MainWindow(object):
         self.menubar.setObjectName("menubar")
         self.menuMenu = QtWidgets.QMenu(self.menubar)
         self.menuMenu.setObjectName("menuMenu")
+        self.menuProfile = QtWidgets.QMenu(self.menubar)
+        self.menuProfile.setObjectName("menuProfile")
         MainWindow.setMenuBar(self.menubar)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
         MainWindow.setStatusBar(self.statusbar)
         self.actionLoad_lite = QtWidgets.QAction(MainWindow)
         self.actionLoad_lite.setObjectName("actionLoad_lite")
+        self.actionRefresh_data = QtWidgets.QAction(MainWindow)
+        self.actionRefresh_data.setObjectName("actionRefresh_data")
         self.actionReload_modules = QtWidgets.QAction(MainWindow)
         self.actionReload_modules.setObjectName("actionReload_modules")
+        self.actionProfile = QtWidgets.QAction(MainWindow)
+        self.actionProfile.setCheckable(True)
+        self.actionProfile.setObjectName("actionProfile")
+        self.actionProfile_cprofile = QtWidgets.QAction(MainWindow)
+        self.actionProfile_cprofile.setCheckable(True)
+        self.actionProfile_cprofile.setObjectName("actionProfile_cprofile")
+        self.actionProfile_history = QtWidgets.QAction(MainWindow)
+        self.actionProfile_history.setObjectName("actionProfile_history")
         self.menuMenu.addAction(self.actionLoad_lite)
+        self.menuMenu.addAction(self.actionRefresh_data)
         self.menuMenu.addAction(self.actionReload_modules)
+        self.menuProfile.addAction(self.actionProfile)
+        self.menuProfile.addAction(self.actionProfile_cprofile)
+        self.menuProfile.addSeparator()
+        self.menuProfile.addAction(self.actionProfile_history)
         self.menubar.addAction(self.menuMenu.menuAction())
+        self.menubar.addAction(self.menuProfile.menuAction())
 
         self.retranslateUi(MainWindow)
         self.tabWidget.setCurrentIndex(-1)
@@ -116,10 +142,23 @@ class Ui_MainWindow(object):
         item.setText(_translate("MainWindow", "rows"))
         item = self.loadedTables.horizontalHeaderItem(2)
         item.setText(_translate("MainWindow", "columns"))
+        item = self.loadedTables.horizontalHeaderItem(3)
+        item.setText(_translate("MainWindow", "bytes"))
+        item = self.loadedTables.horizontalHeaderItem(4)
+        item.setText(_translate("MainWindow", "time"))
+        item = self.loadedTables.horizontalHeaderItem(5)
+        item.setText(_translate("MainWindow", "memory"))
+        item = self.loadedTables.horizontalHeaderItem(6)
+        item.setText(_translate("MainWindow", "state"))
         self.label.setText(_translate("MainWindow", "Log"))
         self.menuMenu.setTitle(_translate("MainWindow", "&File"))
+        self.menuProfile.setTitle(_translate("MainWindow", "&Profile"))
         self.actionLoad_lite.setText(_translate("MainWindow", "&load data"))
+        self.actionRefresh_data.setText(_translate("MainWindow", "r&efresh data"))
         self.actionReload_modules.setText(_translate("MainWindow", "&reload modules"))
+        self.actionProfile.setText(_translate("MainWindow", "&profile analysis functions"))
+        self.actionProfile_cprofile.setText(_translate("MainWindow", "write &cProfile dumps"))
+        self.actionProfile_history.setText(_translate("MainWindow", "profile &history..."))
 
 
 if __name__ == "__main__":
@@ -14,28 +14,30 @@
 # You should have received a copy of the GNU General Public License
 # along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
 import importlib.util
+import os.path
 import traceback
 import functools
+import pickle
+import sys
 from PyQt5.QtGui import QFont
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidgetItem, QHeaderView, QLabel
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QHeaderView, QLabel
 from PyQt5.Qt import Qt
-import matplotlib
-matplotlib.use('QT5Agg')
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-import matplotlib.pyplot as plt
-import matplotlib.style
-import matplotlib.offsetbox
-
-matplotlib.style.use('ggplot')
-import pandas as pd
 
 from .Widgets.TableWidget import TableWidget
-from .helper import load_module
+from .Widgets.TableFilter import TableFilter
+from .Worker import Worker, CancelToken, Cancelled
+from .ResultCache import ResultCache, CacheEntry, function_key
+from .ProcessPool import PoolResult
+from .helper import load_module, read_module_info, call_analysis
+from .ModuleWatcher import source_hash, dependencies
+from .Startup import setup_matplotlib
+from .Profiler import ProfileRun
 
 import typing
 if typing.TYPE_CHECKING:
+    import pandas as pd
     from .App import App
 
 
@@ -46,22 +48,93 @@ class Module(object):
     """
 
     def __init__(self, window: 'App', module_path: str):
-        """
+        """Add the tab of the module, the module is imported and the tab content is built by load,
+        when the tab is activated first.
+        Tab title, table and settings are read from the source without importing it.
 
         """
-        print('[+] loading module %s' % module_path)
         self.window = window
-        self.mod = load_module(module_path)
+        self.module_path = module_path
+        self.source_hash = source_hash(module_path)
+        "hash of the loaded source, see source_changed"
+
+        self.info = read_module_info(module_path)
+        "statically read module attributes, see helper.read_module_info"
+
+        self.mod = None
+        "imported module, None until loaded"
+
+        self.dependencies = set()
+        "names of user helper modules imported by the module"
+
         self.tab = QWidget(window)
-        self.tabIndex = window.tabWidget.addTab(self.tab, self.mod.name)
+        window.tabWidget.addTab(self.tab, self.info['name'] or os.path.splitext(os.path.basename(module_path))[0])
+        self.funcButtons = list()
+
+        self.menu = None
+
+        self.handler = None
+        'Matplotlib mpl_connect handler'
+
+        self.handler_f = None
+        "Matplotlib picker handler function"
+
+        self.worker: typing.Optional[Worker] = None
+        "background thread of the running analysis function"
+
+        self.profile_run: typing.Optional[ProfileRun] = None
+        "measurements of the last run, until its result is drawn"
+
+        self._settings_version = 0
+        "Settings.version when the last run started"
+
+    @property
+    def loaded(self) -> bool:
+        return self.mod is not None
+
+    @property
+    def tabIndex(self) -> int:
+        """Current index of the tab, changes when a tab before it is removed"""
+        return self.window.tabWidget.indexOf(self.tab)
+
+    @property
+    def table_name(self) -> typing.Optional[str]:
+        """Main table of the module"""
+        if self.mod is not None:
+            return getattr(self.mod, 'table', None)
+        return self.info['table']
+
+    def load(self):
+        """Import the module and build the tab content, does nothing if already loaded
+
+        :return:
+        """
+        if self.mod is not None:
+            return
+        print('[+] loading module %s' % self.module_path)
+        # matplotlib is set up on first use, before analysis modules import pyplot
+        setup_matplotlib()
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+        from .Widgets.Canvas import Canvas
+
+        self.source_hash = source_hash(self.module_path)
+        self.mod = load_module(self.module_path)
+        self.dependencies = dependencies(self.mod)
+        self.window.tabWidget.setTabText(self.tabIndex, self.mod.name)
+
         self.figure = plt.gcf()
-        self.canvas = FigureCanvas(self.figure)
+        self.base_figure = self.figure
+        "figure analysis functions draw into, self.figure can be a cached figure"
+        self.canvas = Canvas(self.figure)
         self.toolbar = NavigationToolbar(self.canvas, self.tab)
+        self.renderTime = QLabel()
+        self.toolbar.addWidget(self.renderTime)
+        self.canvas.rendered.connect(self.on_rendered)
         self.layoutV = QVBoxLayout()
         self.layoutH = QHBoxLayout()
         self.layoutCheck = QHBoxLayout()
         self.layoutV.addLayout(self.layoutH)
-        self.funcButtons = list()
         self.add_functions()
         self.layoutV.addWidget(self.toolbar)
         self.layoutV.addWidget(self.canvas)
@@ -69,31 +142,81 @@ class Module(object):
 
         self.table = TableWidget(self, self.tab)
         self.table.hide()
+        self.tableFilter = TableFilter(self.tab)
+        self.tableFilter.hide()
         self.tableTitle = QLabel()
         self.tableTitle.hide()
         newfont = QFont("Noto Sans", 15, QFont.Bold)
         self.tableTitle.setFont(newfont)
         self.tableTitle.setAlignment(Qt.AlignCenter)
         self.layoutV.addWidget(self.tableTitle)
+        self.layoutV.addWidget(self.tableFilter)
         self.layoutV.addWidget(self.table)
 
         self.layoutV.addLayout(self.layoutCheck)
 
-        self.menu = None
+        self.add_actions()
+        if self.info['settings'] is None:
+            # settings not read statically, see apply_settings
+            self.apply_settings()
 
-        self.handler = None
-        'Matplotlib mpl_connect handler'
+    def apply_settings(self):
+        """Create the module settings on the settings widget.
+        Uses the statically read settings if the module is not loaded yet.
 
-        self.handler_f = None
-        "Matplotlib picker handler function"
+        :return:
+        """
+        settings = self.mod.settings if self.mod is not None else self.info['settings']
+        for key, val in (settings or dict()).items():
+            if val is not None:
+                self.window.settings.set_setting(key, val)
 
+    def add_actions(self):
+        """Add module table actions to the table context menu
+
+        :return:
+        """
         for k, v in self.mod.actions.items():
             if k not in self.window.tableActions.keys():
                 self.window.tableActions[k] = [[self, v[0], v[1]]]
             else:
                 self.window.tableActions[k].append([self, v[0], v[1]])
 
-        self.window.settings.get_settings()
+    def remove_actions(self):
+        """Remove module table actions from the table context menu
+
+        :return:
+        """
+        for k in list(self.window.tableActions.keys()):
+            actions = [a for a in self.window.tableActions[k] if a[0] is not self]
+            if actions:
+                self.window.tableActions[k] = actions
+            else:
+                del self.window.tableActions[k]
+
+    def remove(self):
+        """Remove the tab, its table actions and cached results, eg. after the module file was deleted.
+        The module must not be running an analysis function.
+
+        :return:
+        """
+        self.remove_actions()
+        if self.mod is not None:
+            import matplotlib.pyplot as plt
+            self.reset_canvas()
+            self.window.result_cache.discard_module(self.mod.__name__)
+            plt.close(self.base_figure)
+            if sys.modules.get(self.mod.__name__) is self.mod:
+                del sys.modules[self.mod.__name__]
+        self.window.tabWidget.removeTab(self.tabIndex)
+        self.tab.deleteLater()
+
+    def source_changed(self) -> bool:
+        """Check if the module file changed since it was loaded (or read, if not loaded yet)
+
+        :return:
+        """
+        return source_hash(self.module_path) != self.source_hash
 
     def add_functions(self):
         """Add all module Functions as Buttons to UI
@@ -109,51 +232,68 @@ class Module(object):
             self.funcButtons.append(b)
             self.layoutH.addWidget(b)
 
-    def reload(self):
+    def reload(self, helpers_changed: bool = False):
         """reload Module functions
 
+        :param helpers_changed: imported helper modules were reloaded, drop cached results of all functions
         :return:
         """
+        if self.mod is None:
+            # read again, imported on first activation
+            self.source_hash = source_hash(self.module_path)
+            self.info = read_module_info(self.module_path)
+            self.window.tabWidget.setTabText(self.tabIndex, self.info['name'] or
+                                             os.path.splitext(os.path.basename(self.module_path))[0])
+            self.apply_settings()
+            return
+
         for b in self.funcButtons:
             self.layoutH.removeWidget(b)
             b.deleteLater()
             del b
 
         self.reset_canvas()
+        self.remove_actions()
 
+        self.source_hash = source_hash(self.module_path)
         importlib.reload(self.mod)
+        self.dependencies = dependencies(self.mod)
+        keep = set() if helpers_changed else {function_key(f) for f in self.mod.functions.values()}
+        self.window.result_cache.discard_module(self.mod.__name__, keep)
         self.funcButtons = list()
         self.add_functions()
+        self.add_actions()
+        self.apply_settings()
 
-        for key, val in self.mod.settings.items():
-            if val is not None:
-                self.window.settings.set_setting(key, val)
-
-    def show_table(self, df: pd.DataFrame):
+    def show_table(self, df: 'pd.DataFrame'):
         """View DataFrame as Table
 
         :param df: DataFrame to show as Table
         :return:
         """
+        from .Widgets.DataFrameModel import DataFrameModel
         self.tableTitle.show()
         self.table.show()
+        self.tableFilter.show()
         self.tableTitle.setText(df.name)
         self.toolbar.hide()
         self.canvas.hide()
-        self.table.clear()
-        self.table.setRowCount(0)
-        header = df.columns.values
-        self.table.setColumnCount(len(header))
-        self.table.setHorizontalHeaderLabels(header)
-        for index, row in df.iterrows():
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-            for i in range(len(row)):
-                self.table.setItem(row_position, i, QTableWidgetItem(str(row[i])))
+        model = self.table.model()
+        self.table.setSortingEnabled(False)
+        self.table.setModel(DataFrameModel(df, self.table))
+        if model is not None:
+            # release the previous DataFrame
+            model.deleteLater()
+        self.tableFilter.set_model(self.table.model())
+
+        # keep original row order until the user clicks on a header
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
 
         header = self.table.horizontalHeader()
         header.setMaximumSectionSize(800)
-        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        self.table.resizeColumnsToContents()
 
     def plot(self, func):
         """Error handling for _plot function
@@ -161,33 +301,132 @@ class Module(object):
         :param func:
         :return:
         """
+        if self.worker is not None:
+            self.window.msg('Error: analysis function still running')
+            return
         self.window.msgLog.setText('')
         try:
             self._plot(func)
         except Exception as e:
-            traceback.print_tb(e.__traceback__)
-            print(e)
-            self.window.msg('Error: %s' % e)
-            self.tableTitle.show()
-            self.tableTitle.setText('No Data')
-            self.table.hide()
-            self.toolbar.hide()
-            self.canvas.hide()
-            self.window.enable()
+            self.show_error(e)
+
+    def show_error(self, e: Exception):
+        """Show error of analysis function
+
+        :param e:
+        :return:
+        """
+        traceback.print_tb(e.__traceback__)
+        print(e)
+        self.window.msg('Error: %s' % e)
+        self.show_message('No Data')
+        self.window.enable()
+        self._finish_profile('error')
+
+    def show_message(self, msg: str):
+        """Hide figure and table and show message instead
+
+        :param msg:
+        :return:
+        """
+        self.tableTitle.show()
+        self.tableTitle.setText(msg)
+        self.table.hide()
+        self.tableFilter.hide()
+        self.toolbar.hide()
+        self.canvas.hide()
+
+    def set_figure(self, fig):
+        """Show figure on the module canvas
+
+        :param fig: matplotlib Figure
+        :return:
+        """
+        self.figure = fig
+        self.canvas.figure = fig
+        fig.set_canvas(self.canvas)
+
+    def use_cache(self, func) -> bool:
+        """Check if results of func are cached.
+        Enabled by the module attribute cache: True for all functions
+        or a list of function names.
+
+        :param func: analysis function
+        :return:
+        """
+        cache = getattr(self.mod, 'cache', False)
+        if isinstance(cache, bool):
+            return cache
+        return any(self.mod.functions.get(n) is func for n in cache)
+
+    def on_rendered(self, seconds: float):
+        """Show render time of the canvas
+
+        :param seconds: duration of the last draw
+        :return:
+        """
+        self.renderTime.setText('render: %.0f ms' % (seconds * 1000))
+        if self.profile_run is not None:
+            self.profile_run.add('layout', self.canvas.last_layout_time)
+            self.profile_run.add('draw', seconds - self.canvas.last_layout_time)
+            self._finish_profile()
+
+    def _profile_phase(self, name: str):
+        """Context manager timing a phase of the profiled run, does nothing if not profiling
+
+        :param name: phase name
+        :return:
+        """
+        if self.profile_run is None:
+            return contextlib.nullcontext()
+        return self.profile_run.phase(name)
+
+    def _finish_profile(self, status: typing.Optional[str] = None):
+        """Add profiled run to the profiler history
+
+        :param status: run status, see ProfileRun.status
+        :return:
+        """
+        self.window.profiler.finish(self.profile_run, status)
+        self.profile_run = None
+
+    def function_name(self, func) -> str:
+        """Name of the analysis function (button text)
+
+        :param func:
+        :return:
+        """
+        return next((n for n, f in self.mod.functions.items() if f is func), getattr(func, '__name__', repr(func)))
+
+    def on_pick(self, event):
+        """Matplotlib pick_event callback, redraws requested by handler_f are coalesced
+
+        :param event:
+        :return:
+        """
+        if self.handler_f is None:
             return
+        with self.canvas.coalesce_draws():
+            self.handler_f(event)
 
     def reset_canvas(self):
+        if self.mod is None:
+            return
         if self.handler is not None:
             self.canvas.mpl_disconnect(self.handler)
+        self.canvas.clear_overlays()
 
         self.handler = None
         self.handler_f = None
 
     def _plot(self, func):
         """Main plotting function
-        Supported plots:
-        * Matplotlib
-        * pandas DataFrame (as Table)
+        The analysis function runs in a background thread.
+        Its result is displayed by _show_result in the GUI thread.
+
+        Optional keyword arguments of the analysis function:
+        * token: CancelToken, call token.check() regularly to support the cancel button
+        * progress: callback progress(percent) to report progress in the status bar
 
         :param func:
         :return:
@@ -195,49 +434,189 @@ class Module(object):
         self.window.tabWidget.setCurrentIndex(self.tabIndex)
         self.window.msg('loading diagram...')
         self.window.disable()
-        self.window.settings.get_settings()
+        # previous result not drawn (yet)
+        self._finish_profile()
+        self.profile_run = self.window.profiler.start(self.mod.name, self.function_name(func), function_key(func)[2][:8])
+        self._settings_version = self.window.settings.version
+        self.set_figure(self.base_figure)
         self.figure.clear()
         self.reset_canvas()
 
-        gg = func(self.window, fig=self.figure)
+        key = None
+        if self.use_cache(func):
+            key = ResultCache.make_key(func, self.window.settings.args, self.window.data_source.cache_versions())
+            entry = self.window.result_cache.get(key)
+            if entry is not None:
+                if self.profile_run is not None:
+                    self.profile_run.status = 'cached'
+                self._show_cached(entry)
+                return
+
+        # the canvas must not redraw while the worker modifies the figure
+        self.show_message('Running...')
+
+        token = CancelToken()
+        worker = Worker(None, self.window)
+        if hasattr(func, 'ldaf_pool'):
+            data_source = self.window.data_source
+            call = functools.partial(self.window.get_process_pool().run, func, self.module_path,
+                                     self.window.settings.args, data_source.dfs, data_source.versions,
+                                     token=token, progress=worker.report_progress)
+        else:
+            call = functools.partial(call_analysis, func, self.window, fig=self.figure,
+                                     token=token, progress=worker.report_progress)
+        worker.func = functools.partial(self.window.profiler.call, self.profile_run, call,
+                                        local=not hasattr(func, 'ldaf_pool'))
+        worker.progress.connect(self.window.set_progress)
+        worker.finished.connect(functools.partial(self._on_finished, worker, token, key))
+        self.worker = worker
+        self.window.start_task(token)
+        worker.start()
+
+    def _on_finished(self, worker: Worker, token: CancelToken, key: typing.Optional[tuple]):
+        """callback when analysis function returned, runs in GUI thread
+
+        :param worker:
+        :param token:
+        :param key: result cache key, None if not cached
+        :return:
+        """
+        self.worker = None
+        self.window.stop_task()
+        worker.deleteLater()
+        if isinstance(worker.error, Cancelled) or (worker.error is None and token.cancelled):
+            self.figure.clear()
+            self.reset_canvas()
+            self.window.msg('cancelled')
+            self.show_message('Cancelled')
+            self.window.enable()
+            self._finish_profile('cancelled')
+            return
+
+        try:
+            if worker.error is not None:
+                raise worker.error
+            gg = worker.result
+            if isinstance(gg, PoolResult):
+                gg = self._unpack(gg)
+            self._show_result(gg)
+            # settings edited while the function ran: the result may not match the key
+            if key is not None and self._settings_version == self.window.settings.version:
+                self._store_result(key, gg)
+        except Exception as e:
+            self.show_error(e)
+
+    def _unpack(self, result: PoolResult):
+        """Take over result of a function run in the process pool
+
+        :param result:
+        :return: return value of analysis function
+        """
+        from .Decimation import connect_adaptive
+        for msg in result.logs:
+            self.window.log(msg)
+        self.handler_f = result.handler_f
+        if result.kind == 'figure':
+            self.set_figure(pickle.loads(result.value))
+            connect_adaptive(self.figure)
+            return 'matplotlib'
+        if result.name is not None:
+            result.value.name = result.name
+        return result.value
+
+    def _store_result(self, key: tuple, gg):
+        """Store result of analysis function in result cache
+
+        :param key: result cache key
+        :param gg: return value of analysis function
+        :return:
+        """
+        import pandas as pd
+        from .Decimation import adaptive_nbytes
+        from .Raster import Raster
+        if isinstance(gg, pd.DataFrame):
+            entry = CacheEntry('table', gg, int(gg.memory_usage(index=True, deep=True).sum()))
+        elif isinstance(gg, Raster) or gg == 'matplotlib':
+            if self.handler_f is not None:
+                # the picker handler refers to the artists of this figure, not to those of an unpickled copy
+                return
+            if adaptive_nbytes(self.figure) > self.window.result_cache.max_bytes:
+                return
+            try:
+                data = pickle.dumps(self.figure)
+            except Exception as e:
+                self.window.log('Result not cached: %s' % e)
+                return
+            entry = CacheEntry('figure', data, len(data))
+        else:
+            return
+        self.window.result_cache.put(key, entry)
+
+    def _show_cached(self, entry: CacheEntry):
+        """Display cached result of analysis function
+
+        :param entry:
+        :return:
+        """
+        from .Decimation import connect_adaptive
+        if entry.kind == 'table':
+            self._show_result(entry.value)
+        else:
+            self.set_figure(pickle.loads(entry.value))
+            connect_adaptive(self.figure)
+            self.handler_f = None
+            self._show_result('matplotlib')
+        self.window.msg('ready (cached)')
+
+    def _show_result(self, gg):
+        """Display return value of analysis function
+        Supported plots:
+        * Matplotlib
+        * pandas DataFrame (as Table)
+        * Raster (binned scatter data)
+
+        :param gg:
+        :return:
+        """
+        import pandas as pd
+        from .Raster import Raster
         if isinstance(gg, type(None)):
             self.window.msg('ready')
-            self.tableTitle.show()
-            self.tableTitle.setText('No Data')
-            self.table.hide()
-            self.toolbar.hide()
-            self.canvas.hide()
+            self.show_message('No Data')
             self.window.enable()
+            self._finish_profile()
             return
 
         if isinstance(gg, pd.DataFrame):
-            self.show_table(gg)
+            with self._profile_phase('table'):
+                self.show_table(gg)
             self.window.msg('ready')
             self.window.enable()
+            self._finish_profile()
             return
+        elif isinstance(gg, Raster):
+            gg.draw(self.figure)
         elif gg == 'matplotlib':
             pass
         else:
             print('Error: unknown plot element: %r' % gg)
+            self.window.enable()
+            self._finish_profile('error')
             return
 
         if self.handler_f is not None:
-            c = self.canvas.mpl_connect('pick_event', self.handler_f)
+            c = self.canvas.mpl_connect('pick_event', self.on_pick)
             self.handler = c
 
         self.table.hide()
+        self.tableFilter.hide()
         self.tableTitle.hide()
         self.toolbar.show()
         self.figure.set_canvas(self.canvas)
         self.canvas.show()
 
-        self.figure.tight_layout(pad=5, w_pad=3, h_pad=3)
-        self.canvas.draw()
-
-        self.canvas.resize(*self.canvas.get_width_height())
-        self.canvas.resize_event()
-        self.canvas.updateGeometry()
+        # layout and render once, when Qt has resized the canvas
+        self.canvas.request_layout(pad=5, w_pad=3, h_pad=3)
+        self.canvas.draw_idle()
         self.window.msg('ready')
-
-        self.canvas.draw()
         self.window.enable()
@@ -0,0 +1,185 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Selective reload of analysis modules: source hashes, import dependencies on user helper modules
+and a file watcher triggering the reload.
+"""
+
+import ast
+import hashlib
+import importlib
+import importlib.util
+import os
+import sys
+import sysconfig
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from typing import Iterable, List, Optional, Set
+
+
+def source_hash(path: str) -> Optional[str]:
+    """Hash of the file content
+
+    :param path:
+    :return: None if the file does not exist
+    """
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+_system_dirs = tuple(os.path.realpath(p) + os.sep for p in
+                     {sysconfig.get_paths()[k] for k in ('stdlib', 'platstdlib', 'purelib', 'platlib')} |
+                     {os.path.dirname(os.path.abspath(__file__))})
+"standard library, site-packages and ldaf, modules inside are never reloaded"
+
+
+def is_user_module(mod) -> bool:
+    """True for modules loaded from a Python file outside of the standard library, site-packages and ldaf
+
+    :param mod:
+    :return:
+    """
+    path = getattr(mod, '__file__', None)
+    if not path or not path.endswith('.py'):
+        return False
+    return not os.path.realpath(path).startswith(_system_dirs)
+
+
+def user_imports(mod) -> Set[str]:
+    """Names of user modules imported by mod, read from its source
+
+    :param mod:
+    :return:
+    """
+    try:
+        with open(mod.__file__, 'rb') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                try:
+                    base = importlib.util.resolve_name('.' * node.level + base, mod.__package__)
+                except (ImportError, ValueError):
+                    continue
+            names.add(base)
+            # from package import submodule
+            names.update('%s.%s' % (base, alias.name) for alias in node.names)
+    return {n for n in names if n in sys.modules and sys.modules[n] is not mod and is_user_module(sys.modules[n])}
+
+
+def dependencies(mod) -> Set[str]:
+    """Names of user modules imported by mod, directly or through other user modules
+
+    :param mod:
+    :return:
+    """
+    result = set()
+    todo = [mod]
+    while todo:
+        for name in user_imports(todo.pop()):
+            if name not in result:
+                result.add(name)
+                todo.append(sys.modules[name])
+    return result
+
+
+def reload_helpers(changed: Iterable[str], helpers: Iterable[str]) -> List[str]:
+    """Reload changed user modules and the user modules importing them, imported modules first
+
+    :param changed: names of modules whose source changed
+    :param helpers: names of all tracked user modules
+    :return: names of reloaded modules
+    """
+    helpers = {n for n in helpers if n in sys.modules}
+    imports = {n: user_imports(sys.modules[n]) & helpers for n in helpers}
+    stale = set(changed) & helpers
+    while True:
+        more = {n for n in helpers - stale if imports[n] & stale}
+        if not more:
+            break
+        stale |= more
+
+    order = list()
+    seen = set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for dep in imports[name] & stale:
+            visit(dep)
+        order.append(name)
+
+    for name in sorted(stale):
+        visit(name)
+    for name in order:
+        importlib.reload(sys.modules[name])
+    return order
+
+
+class ModuleWatcher(QObject):
+    """Watch analysis modules and their user helper modules,
+    emits changed shortly after the last modification
+
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, modules_dir: str, parent=None, delay: int = 200):
+        """
+
+        :param modules_dir: directory of analysis modules, new files are detected
+        :param parent:
+        :param delay: milliseconds to wait for further modifications (editors write files in several steps)
+        """
+        QObject.__init__(self, parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.addPath(modules_dir)
+        self.watcher.fileChanged.connect(self._on_changed)
+        self.watcher.directoryChanged.connect(self._on_changed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self._on_timeout)
+
+    def watch(self, paths: Iterable[str]):
+        """Watch files, already watched files are ignored
+
+        :param paths:
+        :return:
+        """
+        watched = set(self.watcher.files())
+        paths = [p for p in paths if p not in watched and os.path.exists(p)]
+        if paths:
+            self.watcher.addPaths(paths)
+
+    def _on_changed(self, path: str):
+        if os.path.exists(path) and path not in self.watcher.files() and path not in self.watcher.directories():
+            # editors saving via rename replace the watched file
+            self.watcher.addPath(path)
+        self.timer.start()
+
+    def _on_timeout(self):
+        self.changed.emit()
@@ -0,0 +1,337 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run analysis functions in a persistent process pool.
+The tables are placed once in shared memory (see SharedTables),
+the worker processes build zero-copy DataFrames on them.
+This module must not import Qt, it is imported by the worker processes.
+"""
+
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import pickle
+
+from .helper import load_module, call_analysis
+
+from typing import Callable, Optional
+import typing
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+
+def run_in_pool(partitions: Optional[int] = None, combine: Optional[Callable] = None):
+    """Decorator: run analysis function in the process pool.
+    The function must be defined at module level.
+
+    With partitions, the function is called once per partition with the keyword
+    argument partition=(i, n) and the results are combined in the GUI process.
+
+    :param partitions: number of partitions, None to run the function once
+    :param combine: combine list of partition results, default pd.concat
+    :return:
+    """
+    def decorator(func):
+        func.ldaf_pool = {'partitions': partitions, 'combine': combine}
+        return func
+    return decorator
+
+
+class PoolResult(object):
+    """Result of an analysis function returned from a worker process
+
+    """
+    def __init__(self, kind: str, value, handler_f=None, logs: list = None):
+        self.kind = kind
+        "'figure' (pickled Figure), 'value' (DataFrame, Raster or None)"
+
+        import pandas as pd
+        self.value = value
+        self.name = getattr(value, 'name', None) if isinstance(value, pd.DataFrame) else None
+        "DataFrame.name is not pickled"
+
+        self.handler_f = handler_f
+        self.logs = logs or list()
+
+
+class PoolCancelled(Exception):
+    """Raised inside a worker process by token.check() when the run was cancelled
+
+    """
+    pass
+
+
+class _Token(object):
+    """CancelToken replacement inside worker processes, set by ProcessPool when the run is cancelled"""
+    @property
+    def cancelled(self) -> bool:
+        event = _worker_state['cancel']
+        return event is not None and event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise PoolCancelled()
+
+
+class _Settings(object):
+    """read only settings snapshot inside worker processes"""
+    def __init__(self, args: dict):
+        self.args = args
+
+    def get(self, key):
+        return self.args.get(key)
+
+
+class _DataSource(object):
+    """tables attached from shared memory inside worker processes"""
+    def __init__(self, dfs: dict, versions: dict):
+        self.dfs = dfs
+        self.versions = versions
+
+    def get_table(self, name: str) -> 'pd.DataFrame':
+        return self.dfs[name]
+
+
+class _Module(object):
+    handler_f = None
+
+
+class WorkerApp(object):
+    """Replacement of App passed to analysis functions in worker processes.
+    Provides settings, data_source, log and msg.
+
+    """
+    def __init__(self, settings: dict, dfs: dict, versions: dict):
+        self.settings = _Settings(settings)
+        self.data_source = _DataSource(dfs, versions)
+        self.current_module = _Module()
+        self.logs = list()
+
+    def log(self, msg):
+        self.logs.append(str(msg))
+
+    def msg(self, msg):
+        pass
+
+
+_worker_state = {'generation': None, 'dfs': dict(), 'blocks': list(), 'modules': dict(), 'cancel': None}
+"per worker process: attached tables, loaded modules and the cancel event of the pool"
+
+
+def _init_worker(cancel=None):
+    import matplotlib
+    matplotlib.use('Agg')
+    _worker_state['cancel'] = cancel
+
+
+def _get_tables(generation: int, descriptor: dict) -> dict:
+    from .SharedTables import attach_tables, detach
+    state = _worker_state
+    if state['generation'] != generation:
+        state['dfs'] = dict()
+        detach(state['blocks'])
+        state['dfs'], state['blocks'] = attach_tables(descriptor, allow_pickle=True)
+        state['generation'] = generation
+    return state['dfs']
+
+
+def _get_module(path: str, digest: str):
+    modules = _worker_state['modules']
+    if path not in modules or modules[path][0] != digest:
+        modules[path] = (digest, load_module(path))
+    return modules[path][1]
+
+
+def _run(task: dict) -> PoolResult:
+    """Run analysis function inside worker process
+
+    :param task: see ProcessPool.submit
+    :return:
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    dfs = _get_tables(task['generation'], task['descriptor'])
+    mod = _get_module(task['path'], task['digest'])
+    func = getattr(mod, task['func'])
+    app = WorkerApp(task['settings'], dfs, task['versions'])
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    kwargs = dict(fig=fig, token=_Token(), progress=lambda p: None)
+    if task['partition'] is not None:
+        kwargs['partition'] = task['partition']
+    gg = call_analysis(func, app, **kwargs)
+
+    handler_f = app.current_module.handler_f
+    try:
+        pickle.dumps(handler_f)
+    except Exception:
+        handler_f = None
+    if isinstance(gg, str) and gg == 'matplotlib':
+        return PoolResult('figure', pickle.dumps(fig), handler_f, app.logs)
+    return PoolResult('value', gg, handler_f, app.logs)
+
+
+def file_digest(path: str) -> str:
+    """Hash of file content, used to detect changed modules
+
+    :param path:
+    :return:
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class ProcessPool(object):
+    """Persistent process pool for analysis functions decorated with run_in_pool.
+    Survives Module.reload, workers re-import only modules whose source changed.
+
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        from .SharedTables import SharedTables
+        self.max_workers = max_workers or os.cpu_count()
+        # workers are child processes of this process
+        self.tables = SharedTables(allow_pickle=True)
+        self.generation = 0
+        "incremented whenever the tables are published again"
+
+        self.cancel_timeout = 2.
+        "seconds running partitions get to stop after cancel, then the workers are replaced"
+
+        self._versions = None
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._cancel = None
+        "multiprocessing Event of the executor, set while a cancelled run stops"
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, forking a process with a running Qt application is not safe
+            context = multiprocessing.get_context('spawn')
+            self._cancel = context.Event()
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.max_workers, mp_context=context, initializer=_init_worker, initargs=(self._cancel,))
+        return self._executor
+
+    def _cancel_running(self, pending: set):
+        """Stop the partitions of a cancelled run.
+        Running functions stop at their next token.check(); if they do not within cancel_timeout,
+        the executor is replaced so the next run does not queue behind them.
+
+        :param pending: unfinished futures
+        :return:
+        """
+        running = {f for f in pending if not f.cancel()}
+        if not running:
+            return
+        self._cancel.set()
+        _, running = concurrent.futures.wait(running, timeout=self.cancel_timeout)
+        if running:
+            # the old workers exit once their function returned
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        else:
+            self._cancel.clear()
+
+    def publish(self, dfs: dict, versions: dict):
+        """Place tables in shared memory if they changed since the last publish
+
+        :param dfs: DataSource.dfs
+        :param versions: DataSource.versions
+        :return:
+        """
+        versions = dict(versions)
+        if versions == self._versions and set(dfs.keys()) == set(self.tables.descriptor.keys()):
+            return
+        self.tables.publish(dfs)
+        self._versions = versions
+        self.generation += 1
+
+    def submit(self, func: Callable, path: str, settings: dict, partition: tuple = None) -> concurrent.futures.Future:
+        """Run analysis function in a worker process
+
+        :param func: analysis function, defined at module level
+        :param path: path of the module file
+        :param settings: settings snapshot, eg. Settings.args
+        :param partition: (i, n) or None
+        :return: Future of PoolResult
+        """
+        task = {
+            'path': path,
+            'digest': file_digest(path),
+            'func': func.__name__,
+            'settings': dict(settings),
+            'versions': dict(self._versions or {}),
+            'generation': self.generation,
+            'descriptor': self.tables.descriptor,
+            'partition': partition,
+        }
+        return self._get_executor().submit(_run, task)
+
+    def run(self, func: Callable, path: str, settings: dict, dfs: dict, versions: dict,
+            token=None, progress: Callable = None) -> PoolResult:
+        """Run analysis function (all partitions) and wait for the result.
+        Call from a background thread.
+
+        :param func: analysis function decorated with run_in_pool
+        :param path: path of the module file
+        :param settings: settings snapshot
+        :param dfs: DataSource.dfs
+        :param versions: DataSource.versions
+        :param token: CancelToken
+        :param progress: progress callback
+        :return:
+        """
+        self.publish(dfs, versions)
+        opts = getattr(func, 'ldaf_pool', dict())
+        n = opts.get('partitions')
+        parts = [None] if n is None else [(i, n) for i in range(n)]
+        futures = [self.submit(func, path, settings, p) for p in parts]
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=0.1)
+                if token is not None:
+                    token.check()
+                if progress is not None:
+                    progress(100 * (len(futures) - len(pending)) / len(futures))
+        finally:
+            if pending:
+                self._cancel_running(pending)
+
+        results = [f.result() for f in futures]
+        if n is None:
+            return results[0]
+
+        logs = [m for r in results for m in r.logs]
+        if any(r.kind != 'value' for r in results):
+            raise ValueError('partitioned functions must not return figures')
+        import pandas as pd
+        combine = opts.get('combine') or pd.concat
+        result = PoolResult('value', combine([r.value for r in results]), results[0].handler_f, logs)
+        result.name = results[0].name
+        return result
+
+    def close(self):
+        """Stop worker processes and release shared memory
+
+        :return:
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.tables.close()
+        self._versions = None
@@ -0,0 +1,229 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Profiling of analysis function runs: phase timings, CPU time, peak memory and optional cProfile dumps.
+Enabled with the Profile menu, the runs are listed in the profile history.
+"""
+
+import cProfile
+import csv
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+from typing import Callable, Dict, List, Optional
+
+PHASES = ['body', 'layout', 'draw', 'table']
+"phases of a run, in order"
+
+COLUMNS = ['started', 'module', 'function', 'code', 'status', 'total'] + PHASES + ['cpu', 'peak_memory', 'profile']
+"columns of the exported history"
+
+
+class ProfileRun(object):
+    """Measurements of one run of an analysis function, times in seconds
+
+    """
+    def __init__(self, module: str, function: str, code: str = ''):
+        """
+
+        :param module: module name
+        :param function: function name
+        :param code: hash of the function code, distinguishes runs before and after a reload
+        """
+        self.module = module
+        self.function = function
+        self.code = code
+        self.started = time.time()
+        self.phases: Dict[str, float] = dict()
+        self.cpu: Optional[float] = None
+        "CPU time of the thread running the function body"
+
+        self.peak_memory: Optional[int] = None
+        "peak of memory allocated by Python while the function body ran, bytes"
+
+        self.profile: Optional[str] = None
+        "path of the cProfile dump"
+
+        self.status = 'ok'
+        "ok, cached, error or cancelled"
+
+        self.total: Optional[float] = None
+        self._t = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the body of the with statement as phase name
+
+        :param name:
+        :return:
+        """
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.) + seconds
+
+    def as_dict(self) -> dict:
+        d = {
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='milliseconds'),
+            'module': self.module,
+            'function': self.function,
+            'code': self.code,
+            'status': self.status,
+            'total': self.total,
+            'cpu': self.cpu,
+            'peak_memory': self.peak_memory,
+            'profile': self.profile,
+        }
+        d.update((p, self.phases.get(p)) for p in PHASES)
+        return d
+
+
+class Profiler(object):
+    """Collects ProfileRuns while enabled
+
+    """
+    def __init__(self, max_runs: int = 1000, directory: Optional[str] = None):
+        """
+
+        :param max_runs: length of the history, older runs are dropped
+        :param directory: directory of cProfile dumps, default a temporary directory
+        """
+        self.enabled = False
+        self.cprofile = False
+        "write a cProfile dump of every function body"
+
+        self.directory = directory
+        self.history = deque(maxlen=max_runs)
+        self.on_record: Optional[Callable[[ProfileRun], None]] = None
+        "called in the GUI thread when a run is finished"
+
+        self._lock = threading.Lock()
+
+    def start(self, module: str, function: str, code: str = '') -> Optional[ProfileRun]:
+        """Start measuring a run
+
+        :param module: module name
+        :param function: function name
+        :param code: hash of the function code
+        :return: None if profiling is disabled
+        """
+        if not self.enabled:
+            return None
+        return ProfileRun(module, function, code)
+
+    def call(self, run: Optional[ProfileRun], func: Callable, local: bool = True):
+        """Call func and measure it as body phase, runs in the worker thread
+
+        :param run: None to call func without measuring
+        :param func: function without arguments
+        :param local: False if func runs the work in other processes, CPU time, memory and cProfile are not measured
+        :return: return value of func
+        """
+        if run is None:
+            return func()
+        if not local:
+            with run.phase('body'):
+                return func()
+
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        else:
+            tracemalloc.start()
+            base = 0
+        profile = cProfile.Profile() if self.cprofile else None
+        cpu = time.thread_time()
+        try:
+            with run.phase('body'):
+                if profile is not None:
+                    return profile.runcall(func)
+                return func()
+        finally:
+            run.cpu = time.thread_time() - cpu
+            run.peak_memory = tracemalloc.get_traced_memory()[1] - base
+            if not tracing:
+                tracemalloc.stop()
+            if profile is not None:
+                run.profile = self._dump(run, profile)
+
+    def _dump(self, run: ProfileRun, profile: cProfile.Profile) -> str:
+        with self._lock:
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix='ldaf-profile-')
+            os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.fromtimestamp(run.started).strftime('%Y%m%d-%H%M%S-%f')
+        name = re.sub(r'[^\w.-]+', '_', '%s_%s_%s.prof' % (run.module, run.function, stamp))
+        path = os.path.join(self.directory, name)
+        profile.dump_stats(path)
+        return path
+
+    def finish(self, run: Optional[ProfileRun], status: Optional[str] = None):
+        """Store finished run in the history
+
+        :param run: None is ignored
+        :param status: overrides run status
+        :return:
+        """
+        if run is None or run.total is not None:
+            return
+        if status is not None:
+            run.status = status
+        run.total = time.perf_counter() - run._t
+        with self._lock:
+            self.history.append(run)
+        if self.on_record is not None:
+            self.on_record(run)
+
+    def records(self) -> List[dict]:
+        with self._lock:
+            return [r.as_dict() for r in self.history]
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+
+    def export_csv(self, path: str):
+        """Write history as CSV, times in seconds, memory in bytes
+
+        :param path:
+        :return:
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.records())
+
+    def export_json(self, path: str):
+        """Write history as JSON list of runs
+
+        :param path:
+        :return:
+        """
+        with open(path, 'w') as f:
+            json.dump(self.records(), f, indent=1)
@@ -0,0 +1,217 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import matplotlib.colors
+from matplotlib.image import AxesImage
+
+import typing
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+class Raster(object):
+    """Raster spec, return value of analysis functions for dense scatter data.
+    The points are binned into a 2D grid at canvas resolution and shown with imshow.
+    Zooming bins the visible extent again.
+
+    Example::
+
+        def density(app, fig=None):
+            df = app.data_source.get_table('example')
+            return Raster(df, 'x', 'y', value='price', agg='mean')
+
+    """
+    chunk_size = 10_000_000
+    "points binned at once, bounds the memory of temporary arrays"
+
+    def __init__(self, df: 'pd.DataFrame' = None, x=None, y=None, value=None, agg: str = 'count',
+                 cmap: str = 'viridis', log: bool = None, title: str = None):
+        """
+
+        :param df: DataFrame, if None x, y and value are arrays
+        :param x: x column name or array
+        :param y: y column name or array
+        :param value: optional value column name or array, required for agg other than count
+        :param agg: aggregation per pixel: count, sum, mean, min or max
+        :param cmap: matplotlib colormap
+        :param log: logarithmic color scale, default for count
+        :param title: axes title
+        """
+        if agg not in AGGREGATIONS:
+            raise ValueError('unknown aggregation: %s' % agg)
+        if agg != 'count' and value is None:
+            raise ValueError('aggregation %s requires a value' % agg)
+
+        self.x_label = x if df is not None else None
+        self.y_label = y if df is not None else None
+        if df is not None:
+            x = df[x].to_numpy()
+            y = df[y].to_numpy()
+            value = None if value is None else df[value].to_numpy()
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.value = None if value is None or agg == 'count' else np.asarray(value, dtype=float)
+        self.agg = agg
+        self.cmap = cmap
+        self.log = agg == 'count' if log is None else log
+        self.title = title
+        self._x_sorted = None
+
+    @property
+    def nbytes(self) -> int:
+        """memory of the point arrays"""
+        return self.x.nbytes + self.y.nbytes + (0 if self.value is None else self.value.nbytes)
+
+    def connect(self):
+        """nothing to reconnect, RasterImage bins when it is drawn"""
+        pass
+
+    def bounds(self) -> tuple:
+        """Data extent (x0, x1, y0, y1)
+
+        :return:
+        """
+        return np.nanmin(self.x), np.nanmax(self.x), np.nanmin(self.y), np.nanmax(self.y)
+
+    def _visible(self, x0: float, x1: float) -> slice:
+        if self._x_sorted is None:
+            self._x_sorted = bool(len(self.x) < 2 or np.all(self.x[1:] >= self.x[:-1]))
+        if not self._x_sorted:
+            return slice(None)
+        return slice(np.searchsorted(self.x, x0, side='left'), np.searchsorted(self.x, x1, side='right'))
+
+    def bin(self, x0: float, x1: float, y0: float, y1: float, width: int, height: int) -> np.ndarray:
+        """Aggregate points inside extent into a grid
+
+        :param x0: left
+        :param x1: right
+        :param y0: bottom
+        :param y1: top
+        :param width: number of columns
+        :param height: number of rows
+        :return: array (height, width), NaN for pixels without points
+        """
+        sx = width / (x1 - x0) if x1 != x0 else 0.
+        sy = height / (y1 - y0) if y1 != y0 else 0.
+        size = width * height
+        count = np.zeros(size)
+        acc = None
+        if self.agg in ('sum', 'mean'):
+            acc = np.zeros(size)
+        elif self.agg in ('min', 'max'):
+            acc = np.full(size, np.nan)
+
+        visible = self._visible(x0, x1)
+        x, y = self.x[visible], self.y[visible]
+        v = None if self.value is None else self.value[visible]
+        for start in range(0, len(x), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            fx = (x[chunk] - x0) * sx
+            fy = (y[chunk] - y0) * sy
+            # points on the right and top edge belong to the last pixel
+            fx[fx == width] = width - 1
+            fy[fy == height] = height - 1
+            mask = (fx >= 0) & (fx < width) & (fy >= 0) & (fy < height)
+            idx = fy[mask].astype(np.intp) * width + fx[mask].astype(np.intp)
+            count += np.bincount(idx, minlength=size)
+            if self.agg in ('sum', 'mean'):
+                acc += np.bincount(idx, weights=v[chunk][mask], minlength=size)
+            elif self.agg == 'min':
+                np.fmin.at(acc, idx, v[chunk][mask])
+            elif self.agg == 'max':
+                np.fmax.at(acc, idx, v[chunk][mask])
+
+        if self.agg == 'count':
+            grid = count
+        elif self.agg == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                grid = acc / count
+        else:
+            grid = acc
+        grid[count == 0] = np.nan
+        return grid.reshape(height, width)
+
+    def draw(self, fig) -> 'RasterImage':
+        """Add raster image to figure
+
+        :param fig: matplotlib Figure
+        :return:
+        """
+        ax = fig.axes[0] if fig.axes else fig.add_subplot(111)
+        image = RasterImage(ax, self)
+        ax.add_image(image)
+        if len(self.x):
+            x0, x1, y0, y1 = self.bounds()
+            ax.set_xlim(x0, x1)
+            ax.set_ylim(y0, y1)
+        if self.x_label is not None:
+            ax.set_xlabel(self.x_label)
+            ax.set_ylabel(self.y_label)
+        if self.title is not None:
+            ax.set_title(self.title)
+        ax.grid(False)
+        # placeholder scale, the first draw bins the data and rescales the colorbar
+        image.norm.vmin, image.norm.vmax = 1, 10
+        fig.colorbar(image, ax=ax, label=self.agg)
+        return image
+
+
+class RasterImage(AxesImage):
+    """Image which bins its Raster for the visible extent and axes size when drawn
+
+    """
+    def __init__(self, ax, raster: Raster):
+        norm = matplotlib.colors.LogNorm() if raster.log else matplotlib.colors.Normalize()
+        super().__init__(ax, cmap=raster.cmap, norm=norm, origin='lower', interpolation='nearest')
+        self.raster = raster
+        self.ldaf_adaptive = raster
+        self._view = None
+        self._extent = (0., 1., 0., 1.)
+        self.set_data(np.full((1, 1), np.nan))
+
+    def get_extent(self):
+        return self._extent
+
+    def update_view(self):
+        """Bin raster if extent or size of axes changed
+
+        :return:
+        """
+        x0, x1 = self.axes.get_xlim()
+        y0, y1 = self.axes.get_ylim()
+        width = max(int(self.axes.bbox.width), 1)
+        height = max(int(self.axes.bbox.height), 1)
+        view = (x0, x1, y0, y1, width, height)
+        if view == self._view:
+            return
+        self._view = view
+        grid = self.raster.bin(min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1), width, height)
+        if x0 > x1:
+            grid = grid[:, ::-1]
+        if y0 > y1:
+            grid = grid[::-1]
+        self._extent = (min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1))
+        self.set_data(grid)
+        self.norm.vmin = self.norm.vmax = None
+        if np.isfinite(grid).any():
+            self.autoscale_None()
+
+    def draw(self, renderer, *args, **kwargs):
+        self.update_view()
+        super().draw(renderer, *args, **kwargs)
@@ -0,0 +1,135 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import marshal
+import threading
+from collections import OrderedDict
+
+from typing import Any, Callable, Optional
+
+
+def function_key(func: Callable) -> tuple:
+    """Identity of an analysis function, changes when its code changes
+
+    :param func: analysis function
+    :return: tuple (module name, function name, code hash)
+    """
+    code = getattr(func, '__code__', None)
+    if code is None:
+        digest = repr(func)
+    else:
+        digest = hashlib.sha1(marshal.dumps(code)).hexdigest()
+    return getattr(func, '__module__', None), getattr(func, '__qualname__', repr(func)), digest
+
+
+class CacheEntry(object):
+    """Cached result of an analysis function
+
+    """
+    def __init__(self, kind: str, value: Any, nbytes: int):
+        self.kind = kind
+        "'table' or 'figure'"
+
+        self.value = value
+        "DataFrame or pickled Figure, figures with a picker handler are not cached"
+
+        self.nbytes = nbytes
+
+
+class ResultCache(object):
+    """LRU cache for results of analysis functions with a memory budget.
+    The key consists of the function identity, a snapshot of the settings
+    and the version of all data tables.
+
+    """
+    def __init__(self, max_bytes: int = 512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        "memory budget in bytes"
+
+        self.nbytes = 0
+        "memory used by cached results"
+
+        self._entries: 'OrderedDict[tuple, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(func: Callable, settings: dict, versions: dict) -> tuple:
+        """Create cache key
+
+        :param func: analysis function
+        :param settings: settings, eg. Settings.args
+        :param versions: table versions, eg. DataSource.versions
+        :return:
+        """
+        settings = tuple(sorted((str(k), repr(v)) for k, v in settings.items()))
+        versions = tuple(sorted((str(k), v) for k, v in versions.items()))
+        return function_key(func), settings, versions
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        """Get cached result, None if not cached
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: CacheEntry):
+        """Store result, evicts least recently used results above the memory budget
+
+        :param key:
+        :param entry:
+        :return:
+        """
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def discard_module(self, module: str, keep: set = frozenset()):
+        """Remove cached results of a module, eg. after reload
+
+        :param module: module name
+        :param keep: function keys to keep, eg. functions with unchanged code
+        :return:
+        """
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if key[0][0] == module and key[0] not in keep:
+                    self.nbytes -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        """Remove all cached results
+
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -14,26 +14,54 @@
 # You should have received a copy of the GNU General Public License
 # along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+
 from PyQt5.QtWidgets import QTableWidgetItem, QComboBox
 from PyQt5.Qt import Qt
 
+from .helper import kind_of, parse_setting
+
+from typing import Callable, Dict, List, Optional
+
 import typing
 if typing.TYPE_CHECKING:
     from .App import App
 
+KINDS = ('int', 'float', 'bool', 'choice', 'str')
+"setting kinds, str values which are numeric are read as int"
+
 
 class Settings(object):
     """Class representing the Seeings Widget in the UI.
     A setting is a key, value pair.
     Settings can be created and the value can be read.
 
+    The values are kept in args and updated from the widget signals when the user edits a setting,
+    reading a setting does not touch the widget.
+
     """
     def __init__(self):
         self.args = dict()
+        "setting key -> current value"
+
+        self.kinds: Dict[str, str] = dict()
+        "setting key -> kind, see KINDS"
+
+        self.version = 0
+        "incremented on every change of a setting value"
+
+        self._subscribers: Dict[Optional[str], List[Callable]] = dict()
 
         self.app: 'App' = None
         "reference to QT Application, will be initialised by App"
 
+    def connect_widget(self):
+        """Update settings when the user edits the settings widget, called by App
+
+        :return:
+        """
+        self.app.tableWidget.itemChanged.connect(self.on_item_changed)
+
     def settings_add_combo_box(self, name: str, values: list, func=None):
         """add Combo Box (Drop Down) to settings
 
@@ -42,15 +70,18 @@ class Settings(object):
         :param func: callback for onChange event
         :return:
         """
+        self.kinds[name] = 'choice'
         row = self.app.tableWidget.rowCount()
         self.app.tableWidget.insertRow(row)
         self.app.tableWidget.setItem(row, 0, QTableWidgetItem(name))
         cb = QComboBox()
         if func is not None:
             cb.currentIndexChanged.connect(func)
+        cb.currentTextChanged.connect(functools.partial(self.set, name))
         self.app.tableWidget.setCellWidget(row, 1, cb)
         if values:
             cb.addItems(values)
+        self.set(name, cb.currentText())
 
         return cb
 
@@ -59,24 +90,30 @@ class Settings(object):
 
         :param name: name of setting
         :param value: init value for check box
-        :param func: callback for onChange event
+        :param func: callback for onChange event, func(checked)
         :return:
         """
+        self.kinds[name] = 'bool'
         row = self.app.tableWidget.rowCount()
         self.app.tableWidget.insertRow(row)
         self.app.tableWidget.setItem(row, 0, QTableWidgetItem(name))
+        cb = self._check_item(value)
+
+        if func is not None:
+            self.subscribe(name, lambda key, checked: func(checked))
+
+        self.app.tableWidget.setItem(row, 1, cb)
+
+        return cb
+
+    @staticmethod
+    def _check_item(value: bool) -> QTableWidgetItem:
         cb = QTableWidgetItem()
         cb.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
         if value:
             cb.setCheckState(Qt.Checked)
         else:
             cb.setCheckState(Qt.Unchecked)
-
-        if func is not None:
-            cb.currentIndexChanged.connect(func)
-
-        self.app.tableWidget.setItem(row, 1, cb)
-
         return cb
 
     def add_settings(self):
@@ -85,26 +122,83 @@ class Settings(object):
         """
         raise NotImplementedError
 
-    def set_setting(self, k: str, v: str):
-        """Create new setting on widget
+    def set_setting(self, k: str, v, kind: Optional[str] = None):
+        """Create new setting on widget, or update its value
 
         :param k: setting name, key
         :param v: setting default value
-        :return:
+        :param kind: see KINDS, default from the type of v for a new setting, the kind of an existing setting is kept
+        :return: raises ValueError if text v does not match the kind of the existing setting
         """
         rows = self.app.tableWidget.rowCount()
         for i in range(0, rows):
             e = self.app.tableWidget.item(i, 0).text()
             if e == k:
-                self.app.tableWidget.setItem(i, 1, QTableWidgetItem(v))
+                cb = self.app.tableWidget.cellWidget(i, 1)
+                if isinstance(cb, QComboBox):
+                    index = cb.findText(str(v))
+                    if index >= 0:
+                        cb.setCurrentIndex(index)
+                    return
+                if kind is None:
+                    kind = self.kinds.get(k) or kind_of(v)
+                    if isinstance(v, str):
+                        try:
+                            v = parse_setting(v, kind)
+                        except ValueError:
+                            raise ValueError('invalid %s value for setting %s: %s' % (kind, k, v)) from None
+                self.kinds[k] = kind
+                self.app.tableWidget.setItem(i, 1, self._value_item(k, v))
                 return
 
+        self.kinds[k] = kind or kind_of(v)
         self.app.tableWidget.insertRow(rows)
         self.app.tableWidget.setItem(rows, 0, QTableWidgetItem(k))
-        self.app.tableWidget.setItem(rows, 1, QTableWidgetItem(v))
+        self.app.tableWidget.setItem(rows, 1, self._value_item(k, v))
+
+    def _value_item(self, k: str, v) -> QTableWidgetItem:
+        if self.kinds[k] == 'bool':
+            return self._check_item(bool(v))
+        return QTableWidgetItem(str(v))
+
+    def parse(self, key: str, item: QTableWidgetItem):
+        """Value of a settings widget item
+
+        :param key: setting key
+        :param item: value item
+        :return: value, raises ValueError if the text does not match the kind of the setting
+        """
+        if not item.flags() & Qt.ItemIsEditable:
+            return bool(item.checkState())
+        return parse_setting(item.text(), self.kinds.get(key, 'str'))
+
+    def on_item_changed(self, item: QTableWidgetItem):
+        """Qt callback, a settings widget item was edited
+
+        :param item:
+        :return:
+        """
+        if item.column() != 1:
+            return
+        key = self.app.tableWidget.item(item.row(), 0)
+        if key is None:
+            return
+        key = key.text()
+        try:
+            self.set(key, self.parse(key, item))
+        except ValueError:
+            self.app.msg('Error: invalid %s value for %s: %s' % (self.kinds.get(key), key, item.text()))
+            if key in self.args:
+                # show the value which is used
+                blocked = self.app.tableWidget.blockSignals(True)
+                try:
+                    item.setText(str(self.args[key]))
+                finally:
+                    self.app.tableWidget.blockSignals(blocked)
 
     def get_settings(self):
-        """Read settings from Widget and store then in internal state
+        """Read all settings from Widget again and store them in internal state.
+        Not required, edits are applied when they happen.
 
         :return:
         """
@@ -113,14 +207,10 @@ class Settings(object):
             e = self.app.tableWidget.item(i, 0).text()
             v = self.app.tableWidget.cellWidget(i, 1)
             if v is None:
-                v = self.app.tableWidget.item(i, 1)
-                ret = v.flags() & Qt.ItemIsEditable
-                if not ret:
-                    v = bool(v.checkState())
-                else:
-                    v = v.text()
-                    if v.isnumeric():
-                        v = int(v)
+                try:
+                    v = self.parse(e, self.app.tableWidget.item(i, 1))
+                except ValueError:
+                    continue
 
             elif isinstance(v, QComboBox):
                 v = v.currentText()
@@ -131,22 +221,47 @@ class Settings(object):
             self.set(e, v)
 
     def get(self, key):
-        """Read setting by key
+        """Read setting by key, can be called from any thread
 
         :param key: setting key to read
-        :return:
+        :return: None if the setting does not exist
         """
-        self.get_settings()
-
-        if key not in self.args:
-            return None
-        return self.args[key]
+        return self.args.get(key)
 
     def set(self, key, value):
-        """Update setting
+        """Update setting, subscribers are notified if the value changed
 
         :param key: setting key
         :param value: new value
         :return:
         """
+        if key in self.args and self.args[key] == value and type(self.args[key]) is type(value):
+            return
         self.args[key] = value
+        self.version += 1
+        for func in self._subscribers.get(key, list()) + self._subscribers.get(None, list()):
+            try:
+                func(key, value)
+            except Exception as e:
+                print('[+] Warning: settings subscriber failed: %s' % e)
+
+    def subscribe(self, key: Optional[str], func: Callable[[str, object], None]) -> Callable:
+        """Call func(key, value) when the value of a setting changed
+
+        :param key: setting key, None for all settings
+        :param func:
+        :return: func, eg. for unsubscribe
+        """
+        self._subscribers.setdefault(key, list()).append(func)
+        return func
+
+    def unsubscribe(self, key: Optional[str], func: Callable):
+        """Remove subscription
+
+        :param key: setting key, None for all settings
+        :param func:
+        :return:
+        """
+        funcs = self._subscribers.get(key, list())
+        if func in funcs:
+            funcs.remove(func)
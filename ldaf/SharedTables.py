@@ -0,0 +1,191 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import pickle
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict, List, Tuple
+
+
+_JSON_TYPES = {'empty', 'string', 'integer', 'floating', 'mixed-integer-float', 'boolean'}
+"results of pandas.api.types.infer_dtype whose values survive a JSON round trip"
+
+
+def _is_plain(values) -> bool:
+    return isinstance(values, np.ndarray) and values.dtype.kind in 'biufcmM'
+
+
+def _json_default(value):
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _attach(name: str, untrack: bool) -> shared_memory.SharedMemory:
+    """Attach to an existing shared memory block
+
+    :param name: block name
+    :param untrack: do not unlink the block when this process exits,
+        required for processes not started by the owner
+    :return:
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        if untrack:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedTables(object):
+    """Owner of DataFrames placed in shared memory.
+    Numeric, bool and datetime columns (and categorical codes) are shared zero-copy,
+    other columns are encoded as JSON (or pickled, see allow_pickle) into a shared block and copied on attach.
+
+    """
+    def __init__(self, allow_pickle: bool = False):
+        """
+
+        :param allow_pickle: pickle object columns which are not JSON compatible,
+            only for readers trusting this process (attach_tables with allow_pickle).
+            Otherwise such values are stored as str.
+        """
+        self.allow_pickle = allow_pickle
+        self.blocks: List[shared_memory.SharedMemory] = list()
+        self.descriptor: Dict[str, dict] = dict()
+        "JSON serializable description of the shared tables, see attach_tables"
+
+    def _share(self, data: bytes = None, array: np.ndarray = None) -> str:
+        size = len(data) if data is not None else array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.blocks.append(shm)
+        if data is not None:
+            shm.buf[:size] = data
+        else:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        return shm.name
+
+    def _share_values(self, values) -> tuple:
+        if isinstance(values, pd.Categorical):
+            codes = np.asarray(values.codes)
+            return ['category', self._share(array=codes), codes.dtype.str, len(codes),
+                    self._share_values(values.categories.to_numpy()), bool(values.ordered)]
+        if _is_plain(values):
+            values = np.ascontiguousarray(values)
+            return ['array', self._share(array=values), values.dtype.str, len(values)]
+        if self.allow_pickle and pd.api.types.infer_dtype(values, skipna=True) not in _JSON_TYPES:
+            data = pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+            return ['pickle', self._share(data=data), len(data)]
+        data = json.dumps(list(values), default=_json_default).encode()
+        return ['json', self._share(data=data), len(data), len(values)]
+
+    def publish(self, dfs: dict) -> Dict[str, dict]:
+        """Place tables in shared memory, replaces previously published tables
+
+        :param dfs: table name -> DataFrame, other table types are skipped
+        :return: descriptor
+        """
+        self.close()
+        descriptor = dict()
+        for name, df in dfs.items():
+            if not isinstance(df, pd.DataFrame):
+                continue
+            columns = list()
+            for i, col in enumerate(df.columns):
+                s = df.iloc[:, i]
+                values = s.array if isinstance(s.dtype, pd.CategoricalDtype) else s.to_numpy()
+                columns.append([col, self._share_values(values)])
+            if isinstance(df.index, pd.RangeIndex):
+                index = ['range', int(df.index.start), int(df.index.stop), int(df.index.step)]
+            else:
+                index = self._share_values(df.index.to_numpy())
+            descriptor[name] = {'columns': columns, 'index': index}
+        self.descriptor = descriptor
+        return descriptor
+
+    def close(self):
+        """Release and unlink all shared memory blocks
+
+        :return:
+        """
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = list()
+        self.descriptor = dict()
+
+
+def _attach_values(spec: list, blocks: list, untrack: bool, allow_pickle: bool):
+    kind = spec[0]
+    if kind not in ('array', 'category', 'json', 'pickle') or (kind == 'pickle' and not allow_pickle):
+        raise ValueError('unsupported column encoding: %s' % kind)
+    shm = _attach(spec[1], untrack)
+    blocks.append(shm)
+    if kind == 'pickle':
+        return pickle.loads(shm.buf[:spec[2]])
+    if kind == 'json':
+        return np.fromiter(json.loads(bytes(shm.buf[:spec[2]])), dtype=object, count=spec[3])
+    values = np.ndarray((spec[3],), dtype=np.dtype(spec[2]), buffer=shm.buf)
+    values.flags.writeable = False
+    if kind == 'category':
+        categories = _attach_values(spec[4], blocks, untrack, allow_pickle)
+        return pd.Categorical.from_codes(values, categories=categories, ordered=spec[5])
+    return values
+
+
+def attach_tables(descriptor: Dict[str, dict], untrack: bool = False,
+                  allow_pickle: bool = False) -> Tuple[dict, list]:
+    """Build DataFrames on shared memory published by SharedTables.
+    Plain columns are read only views on the shared blocks.
+
+    :param descriptor: SharedTables.descriptor
+    :param untrack: see _attach
+    :param allow_pickle: accept pickled columns, only if the publisher is trusted
+    :return: dict table name -> DataFrame, list of attached blocks (keep alive while the tables are used)
+    """
+    dfs = dict()
+    blocks = list()
+    for name, spec in descriptor.items():
+        data = {col: _attach_values(values, blocks, untrack, allow_pickle) for col, values in spec['columns']}
+        index = spec['index']
+        if index[0] == 'range':
+            index = pd.RangeIndex(index[1], index[2], index[3])
+        else:
+            index = _attach_values(index, blocks, untrack, allow_pickle)
+        dfs[name] = pd.DataFrame(data, index=index, copy=False)
+    return dfs, blocks
+
+
+def detach(blocks: list):
+    """Close attached blocks, tables built on them must not be used anymore
+
+    :param blocks: second return value of attach_tables
+    :return:
+    """
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # still referenced by a live array, released on garbage collection
+            pass
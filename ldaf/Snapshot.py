@@ -0,0 +1,249 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""On-disk columnar snapshot of loaded tables.
+Every column is stored as a raw .npy file, the tables are memory-mapped on load,
+so only the pages of columns which are actually used are read.
+"""
+
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from typing import Iterable, List, Optional
+
+FORMAT = 1
+"snapshot format version, snapshots of other versions are ignored"
+
+
+def _is_plain(dtype) -> bool:
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+
+
+def _write_values(values, directory: str, name: str) -> tuple:
+    """Write column values, return spec used by _read_values
+
+    :param values: Series or Index
+    :param directory: table directory
+    :param name: file name without extension
+    :return:
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        np.save(os.path.join(directory, name + '.npy'), np.asarray(values.array.codes))
+        return 'category', name + '.npy', values.dtype.categories, values.dtype.ordered
+    if _is_plain(values.dtype):
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(values.to_numpy()))
+        return 'array', name + '.npy'
+    # object, string and extension dtypes, loaded into memory
+    with open(os.path.join(directory, name + '.pkl'), 'wb') as f:
+        pickle.dump(values.array, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return 'pickle', name + '.pkl'
+
+
+def _read_values(spec: tuple, directory: str, mmap: bool):
+    path = os.path.join(directory, spec[1])
+    if spec[0] == 'pickle':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    # copy on write, in place modifications do not change the snapshot
+    values = np.load(path, mmap_mode='c' if mmap else None)
+    if spec[0] == 'category':
+        return pd.Categorical.from_codes(values, categories=spec[2], ordered=spec[3])
+    return values
+
+
+def write_frame(df: pd.DataFrame, directory: str):
+    """Write DataFrame as one file per column and a schema file
+
+    :param df: table
+    :param directory: table directory, created if missing
+    :return:
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns = list()
+    for i, col in enumerate(df.columns):
+        columns.append((col, _write_values(df.iloc[:, i], directory, 'c%d' % i)))
+    if isinstance(df.index, pd.RangeIndex):
+        index = ('range', df.index.start, df.index.stop, df.index.step)
+    else:
+        index = _write_values(df.index, directory, 'index')
+    schema = {'columns': columns, 'index': index, 'index_name': df.index.name, 'rows': len(df),
+              'name': getattr(df, 'name', None)}
+    with open(os.path.join(directory, 'schema.pkl'), 'wb') as f:
+        pickle.dump(schema, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_schema(directory: str) -> dict:
+    """Read schema written by write_frame
+
+    :param directory: table directory
+    :return:
+    """
+    with open(os.path.join(directory, 'schema.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+def read_frame(directory: str, mmap: bool = True, columns: Optional[list] = None) -> pd.DataFrame:
+    """Read DataFrame written by write_frame
+
+    :param directory: table directory
+    :param mmap: memory-map the column files instead of reading them
+    :param columns: read only these columns, default all
+    :return:
+    """
+    schema = read_schema(directory)
+    specs = schema['columns']
+    if columns is not None:
+        specs = dict(specs)
+        specs = [(col, specs[col]) for col in columns]
+    data = {col: _read_values(spec, directory, mmap) for col, spec in specs}
+    index = schema['index']
+    if index[0] == 'range':
+        index = pd.RangeIndex(index[1], index[2], index[3])
+    else:
+        index = _read_values(index, directory, mmap)
+    df = pd.DataFrame(data, index=index, copy=False)
+    df.index.name = schema['index_name']
+    if schema['name'] is not None:
+        df.name = schema['name']
+    return df
+
+
+def fingerprint(paths: List[str]) -> List[list]:
+    """Fingerprint of source files: path, size and modification time
+
+    :param paths: source files
+    :return:
+    """
+    result = list()
+    for p in sorted(os.path.abspath(p) for p in paths):
+        st = os.stat(p)
+        result.append([p, st.st_size, st.st_mtime_ns])
+    return result
+
+
+class Snapshot(object):
+    """Snapshot of DataSource tables in a directory, valid as long as the source files did not change
+
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, 'manifest.json')
+
+    def read_manifest(self) -> Optional[dict]:
+        """Return manifest of the snapshot, None if there is no readable snapshot
+
+        :return:
+        """
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format') != FORMAT:
+            return None
+        return manifest
+
+    def is_valid(self, sources: List[list], reloadable: Iterable[str] = ()) -> bool:
+        """Check whether the snapshot was written from the current source files
+        and the tables which are not stored in it can be loaded from source
+
+        :param sources: fingerprint of the source files
+        :param reloadable: names of tables with a loader, see DataSource.get_loaders
+        :return:
+        """
+        manifest = self.read_manifest()
+        return manifest is not None and bool(sources) and manifest['sources'] == sources and \
+            set(manifest.get('skipped', ())) <= set(reloadable)
+
+    def skipped(self) -> List[str]:
+        """Names of the tables which are not stored in the snapshot (not DataFrames), they are loaded from source
+
+        :return:
+        """
+        manifest = self.read_manifest()
+        return list() if manifest is None else list(manifest.get('skipped', ()))
+
+    def tables(self) -> List[str]:
+        """Names of the tables in the snapshot
+
+        :return:
+        """
+        manifest = self.read_manifest()
+        return list() if manifest is None else list(manifest['tables'].keys())
+
+    def marks(self) -> dict:
+        """High-water marks of the tables when the snapshot was written, see DataSource.marks
+
+        :return:
+        """
+        manifest = self.read_manifest()
+        return dict() if manifest is None else dict(manifest.get('marks', dict()))
+
+    def load_table(self, name: str) -> pd.DataFrame:
+        """Memory-map table of the snapshot
+
+        :param name: table name
+        :return:
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise FileNotFoundError('no snapshot in %s' % self.directory)
+        return read_frame(os.path.join(self.directory, manifest['tables'][name]))
+
+    def save(self, dfs: dict, sources: List[list], marks: Optional[dict] = None, reloadable: Iterable[str] = ()):
+        """Write tables and the fingerprint of the source files.
+        The new snapshot replaces the old one once it is complete.
+
+        :param dfs: table name -> DataFrame, other table types (eg. ChunkedTable) are recorded as skipped
+        :param sources: fingerprint of the source files taken before the tables were loaded
+        :param marks: high-water marks of the tables, marks which are no JSON values are not stored
+        :param reloadable: names of tables with a loader, skipped tables are loaded with it from source
+        :return: raises ValueError if a table is skipped which has no loader, the snapshot is not written
+        """
+        skipped = [name for name, df in dfs.items() if not isinstance(df, pd.DataFrame)]
+        missing = set(skipped) - set(reloadable)
+        if missing:
+            raise ValueError('tables %s are no DataFrames and have no loader' % ', '.join(sorted(missing)))
+        tmp = self.directory.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        tables = dict()
+        for i, (name, df) in enumerate(dfs.items()):
+            if not isinstance(df, pd.DataFrame):
+                continue
+            tables[name] = 't%d' % i
+            write_frame(df, os.path.join(tmp, tables[name]))
+        stored = dict()
+        for name, mark in (marks or dict()).items():
+            if name in tables:
+                try:
+                    json.dumps(mark)
+                except (TypeError, ValueError):
+                    continue
+                stored[name] = mark
+        manifest = {'format': FORMAT, 'sources': sources, 'tables': tables, 'skipped': skipped, 'marks': stored}
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp, self.directory)
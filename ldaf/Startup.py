@@ -0,0 +1,127 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Startup helpers: phase timing, background preloading of heavy modules and the one time matplotlib setup.
+Imported by App before anything else, so the timer starts with the import of the framework.
+"""
+
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+from typing import Iterable, List, Tuple
+
+
+class PhaseTimer(object):
+    """Wall clock duration of named phases, for the startup report
+
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = list()
+        "(phase name, seconds) in order of completion"
+
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        """Record phase, can be called from any thread
+
+        :param name:
+        :param seconds:
+        :return:
+        """
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the body of the with statement as phase name
+
+        :param name:
+        :return:
+        """
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def report(self) -> str:
+        """Phases and total time since the timer was created
+
+        :return:
+        """
+        with self._lock:
+            phases = list(self.phases)
+        lines = ['Startup %.0f ms' % (self.elapsed() * 1000)]
+        lines += ['  %-20s %6.0f ms' % (name, seconds * 1000) for name, seconds in phases]
+        return '\n'.join(lines)
+
+
+startup = PhaseTimer()
+"startup phases of the application, reported in the log when the first tab is shown"
+
+_matplotlib_lock = threading.Lock()
+_matplotlib_ready = False
+_preloads: List[threading.Thread] = list()
+
+
+def setup_matplotlib():
+    """Select the Qt backend and the style, once.
+    Must be called in the GUI thread before the first figure is created.
+    Waits for running preloads, switching the backend of a partially imported pyplot fails.
+
+    :return:
+    """
+    global _matplotlib_ready
+    with _matplotlib_lock:
+        if _matplotlib_ready:
+            return
+        with startup.phase('matplotlib setup'):
+            for thread in _preloads:
+                thread.join()
+            import matplotlib
+            matplotlib.use('QT5Agg')
+            import matplotlib.style
+            matplotlib.style.use('ggplot')
+        _matplotlib_ready = True
+
+
+def preload(modules: Iterable[str]) -> threading.Thread:
+    """Import modules in a background thread, so their first use in the GUI thread does not block.
+    Importing a module which is still being preloaded waits for it.
+
+    :param modules: module names
+    :return: thread
+    """
+    modules = list(modules)
+
+    def run():
+        with startup.phase('preload (background)'):
+            for name in modules:
+                try:
+                    importlib.import_module(name)
+                except ImportError:
+                    pass
+
+    thread = threading.Thread(target=run, name='ldaf-preload', daemon=True)
+    _preloads.append(thread)
+    thread.start()
+    return thread
@@ -0,0 +1,121 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Secondary indexes on table columns, see DataSource.declare_index.
+Lookups return row positions (for DataFrame.iloc) in table order.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class HashIndex(object):
+    """value -> row positions, for equality lookups
+
+    """
+    kind = 'hash'
+
+    def __init__(self, values):
+        """
+
+        :param values: column values
+        """
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        self.uniques = pd.Index(uniques)
+        valid = codes >= 0
+        # stable: positions of each value stay in table order
+        self.order = np.argsort(codes, kind='stable')[np.count_nonzero(~valid):]
+        self.offsets = np.zeros(len(uniques) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(codes[valid], minlength=len(uniques)), out=self.offsets[1:])
+
+    @property
+    def nbytes(self) -> int:
+        return self.order.nbytes + self.offsets.nbytes
+
+    def lookup(self, value) -> np.ndarray:
+        """Row positions with column == value
+
+        :param value:
+        :return:
+        """
+        code = self.uniques.get_indexer([value])[0]
+        if code < 0:
+            return np.empty(0, dtype=np.intp)
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def lookup_many(self, values) -> np.ndarray:
+        """Row positions with column in values
+
+        :param values:
+        :return:
+        """
+        parts = [self.lookup(v) for v in values]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+
+
+class SortedIndex(object):
+    """Sorted column values with their row positions, for equality and range lookups
+
+    """
+    kind = 'sorted'
+
+    def __init__(self, values):
+        """
+
+        :param values: column values, must be sortable
+        """
+        values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+        self.order = np.argsort(values, kind='stable')
+        self.sorted = values[self.order]
+        if self.sorted.dtype.kind == 'f':
+            # NaN are sorted last, exclude them from searches
+            self.n = len(self.sorted) - np.count_nonzero(np.isnan(self.sorted))
+        elif self.sorted.dtype.kind in 'mM':
+            self.n = len(self.sorted) - np.count_nonzero(np.isnat(self.sorted))
+        else:
+            self.n = len(self.sorted)
+
+    @property
+    def nbytes(self) -> int:
+        return self.order.nbytes + self.sorted.nbytes
+
+    def _positions(self, lo: int, hi: int) -> np.ndarray:
+        return np.sort(self.order[lo:hi])
+
+    def lookup(self, value) -> np.ndarray:
+        """Row positions with column == value
+
+        :param value:
+        :return:
+        """
+        s = self.sorted[:self.n]
+        return self._positions(np.searchsorted(s, value, 'left'), np.searchsorted(s, value, 'right'))
+
+    def lookup_range(self, lo=None, hi=None, closed: str = 'both') -> np.ndarray:
+        """Row positions with lo <= column <= hi
+
+        :param lo: lower bound, None for unbounded
+        :param hi: upper bound, None for unbounded
+        :param closed: 'both', 'left', 'right' or 'neither'
+        :return:
+        """
+        s = self.sorted[:self.n]
+        start = 0 if lo is None else np.searchsorted(s, lo, 'left' if closed in ('both', 'left') else 'right')
+        end = self.n if hi is None else np.searchsorted(s, hi, 'right' if closed in ('both', 'right') else 'left')
+        return self._positions(start, max(start, end))
+
+
+INDEX_TYPES = {'hash': HashIndex, 'sorted': SortedIndex}
@@ -0,0 +1,230 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections.abc
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from typing import Callable, Dict, Optional
+
+RESIDENT = 'resident'
+SPILLED = 'spilled'
+
+
+def _is_frame(df) -> bool:
+    # pandas is imported on first use
+    import pandas as pd
+    return isinstance(df, pd.DataFrame)
+
+
+class TableStore(collections.abc.MutableMapping):
+    """Dict of tables with a memory budget.
+    When the resident DataFrames exceed the budget, the least recently used tables are
+    written to disk (one .npy file per column) and removed from memory.
+    A spilled table is read again on its next access.
+
+    """
+    def __init__(self, budget: Optional[int] = None, directory: Optional[str] = None):
+        """
+
+        :param budget: memory budget in bytes for resident tables, None for no limit
+        :param directory: spill directory, default a temporary directory
+        """
+        self.budget = budget
+        self.directory = directory
+        self._temporary = directory is None
+        self._resident: Dict[str, object] = collections.OrderedDict()
+        "table name -> table, least recently used first"
+
+        self._spilled: Dict[str, str] = dict()
+        "table name -> spill directory"
+
+        self._names: Dict[str, None] = dict()
+        "all table names in insertion order"
+
+        self._info: Dict[str, dict] = dict()
+        "table name -> shape, nbytes, columns"
+
+        self.last_access: Dict[str, float] = dict()
+        "table name -> time of last access"
+
+        self.on_change: Optional[Callable[[str], None]] = None
+        "called with the table name when a table is spilled or reloaded, from the accessing thread"
+
+        self._lock = threading.RLock()
+        self._ids = itertools.count()
+
+    def _spill_dir(self) -> str:
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='ldaf-spill-')
+        return os.path.join(self.directory, 't%d' % next(self._ids))
+
+    def _notify(self, name: str):
+        if self.on_change is not None:
+            self.on_change(name)
+
+    def __getitem__(self, name: str):
+        with self._lock:
+            self.last_access[name] = time.time()
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return self._resident[name]
+            if name not in self._spilled:
+                raise KeyError(name)
+            from .Snapshot import read_frame
+            path = self._spilled[name]
+            df = read_frame(path, mmap=False)
+            del self._spilled[name]
+            shutil.rmtree(path, ignore_errors=True)
+            self._resident[name] = df
+            self._enforce_budget(keep=name)
+        self._notify(name)
+        return df
+
+    def __setitem__(self, name: str, df):
+        with self._lock:
+            self._discard_spilled(name)
+            self._names[name] = None
+            self._resident[name] = df
+            self._resident.move_to_end(name)
+            self.last_access[name] = time.time()
+            self._info[name] = {'shape': df.shape, 'nbytes': self._frame_nbytes(df, self._info.get(name)),
+                                'columns': list(df.columns) if _is_frame(df) else None}
+            self._enforce_budget(keep=name)
+
+    @staticmethod
+    def _frame_nbytes(df, previous: Optional[dict]) -> int:
+        """Deep memory of a table. A table which grew by appended rows (same columns, more rows)
+        only measures the new rows, refreshes cost O(new rows) for object and string columns.
+
+        :param df: new table
+        :param previous: info of the table it replaces
+        :return:
+        """
+        if not _is_frame(df):
+            return 0
+        if previous is not None and previous['columns'] == list(df.columns) and \
+                previous['shape'][0] <= len(df):
+            tail = df.iloc[previous['shape'][0]:].memory_usage(index=True, deep=True).sum()
+            # without per column overhead counted in previous, eg. categories
+            empty = df.iloc[:0].memory_usage(index=True, deep=True).sum()
+            return previous['nbytes'] + int(tail - empty)
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def __delitem__(self, name: str):
+        with self._lock:
+            if name not in self._names:
+                raise KeyError(name)
+            self._discard_spilled(name)
+            self._resident.pop(name, None)
+            del self._names[name]
+            del self._info[name]
+            self.last_access.pop(name, None)
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def __len__(self):
+        return len(self._names)
+
+    def _discard_spilled(self, name: str):
+        path = self._spilled.pop(name, None)
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _enforce_budget(self, keep: str = None):
+        if self.budget is None:
+            return
+        spilled = list()
+        for name in list(self._resident.keys()):
+            if self.resident_bytes() <= self.budget:
+                break
+            if name == keep or not _is_frame(self._resident[name]):
+                continue
+            self._spill(name)
+            spilled.append(name)
+        for name in spilled:
+            self._notify(name)
+
+    def _spill(self, name: str):
+        path = self._spill_dir()
+        shutil.rmtree(path, ignore_errors=True)
+        from .Snapshot import write_frame
+        write_frame(self._resident[name], path)
+        self._spilled[name] = path
+        del self._resident[name]
+
+    def spill(self, name: str):
+        """Write table to disk and release it from memory
+
+        :param name: table name
+        :return:
+        """
+        with self._lock:
+            if name not in self._resident or not _is_frame(self._resident[name]):
+                return
+            self._spill(name)
+        self._notify(name)
+
+    def state(self, name: str) -> str:
+        """'resident' or 'spilled'
+
+        :param name: table name
+        :return:
+        """
+        return SPILLED if name in self._spilled else RESIDENT
+
+    def shape(self, name: str) -> tuple:
+        """Shape of table without reloading it
+
+        :param name: table name
+        :return:
+        """
+        return self._info[name]['shape']
+
+    def nbytes(self, name: str) -> int:
+        """Deep memory of the table when it is resident
+
+        :param name: table name
+        :return:
+        """
+        return self._info[name]['nbytes']
+
+    def resident_bytes(self) -> int:
+        """Memory of all resident tables
+
+        :return:
+        """
+        return sum(self._info[name]['nbytes'] for name in self._resident)
+
+    def close(self):
+        """Remove spill files, spilled tables are lost
+
+        :return:
+        """
+        with self._lock:
+            for name in list(self._spilled):
+                self._discard_spilled(name)
+            if self._temporary and self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
@@ -0,0 +1,131 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cached time column metadata (min, max, sortedness) and O(log n) time window slicing.
+The metadata is computed once per DataFrame and column and dropped with the DataFrame.
+"""
+
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from .TableIndex import SortedIndex
+
+from typing import Dict, Optional
+
+_cache: Dict[tuple, 'TimeIndex'] = dict()
+"(id(df), column) -> TimeIndex"
+
+_lock = threading.Lock()
+
+
+class TimeIndex(object):
+    """Metadata of a time column: min, max and whether it is sorted.
+    Unsorted columns get a SortedIndex on first window query.
+
+    """
+    def __init__(self, values: np.ndarray):
+        self.ptr = values.__array_interface__['data'][0] if len(values) else None
+        "data pointer of the column, detects replaced columns"
+
+        self.n = len(values)
+        kind = values.dtype.kind
+        missing = (kind == 'f' and np.isnan(values).any()) or (kind in 'mM' and np.isnat(values).any())
+        self.sorted = bool(not missing and (self.n < 2 or not np.any(values[1:] < values[:-1])))
+        if self.sorted and self.n:
+            self.min, self.max = values[0], values[-1]
+        else:
+            s = pd.Series(values)
+            self.min, self.max = (s.min(), s.max()) if s.notna().any() else (None, None)
+        self.index: Optional[SortedIndex] = None
+
+    def matches(self, values: np.ndarray) -> bool:
+        return len(values) == self.n and (self.n == 0 or values.__array_interface__['data'][0] == self.ptr)
+
+    def window(self, values: np.ndarray, t0=None, t1=None, closed: str = 'left'):
+        """Row selection for t0 <= time < t1
+
+        :param values: column values
+        :param t0: start, None for unbounded
+        :param t1: end, None for unbounded
+        :param closed: 'left' (default), 'right', 'both' or 'neither'
+        :return: slice if the column is sorted, else sorted row positions
+        """
+        if values.dtype.kind == 'M':
+            t0 = None if t0 is None else pd.Timestamp(t0).to_datetime64()
+            t1 = None if t1 is None else pd.Timestamp(t1).to_datetime64()
+        if self.sorted:
+            lo = 0 if t0 is None else np.searchsorted(values, t0, 'left' if closed in ('both', 'left') else 'right')
+            hi = self.n if t1 is None else np.searchsorted(values, t1, 'right' if closed in ('both', 'right') else 'left')
+            return slice(int(lo), int(max(lo, hi)))
+        if self.index is None:
+            self.index = SortedIndex(values)
+        return self.index.lookup_range(t0, t1, closed)
+
+
+def _values(df: pd.DataFrame, column: str) -> np.ndarray:
+    return df[column].to_numpy()
+
+
+def get_time_index(df: pd.DataFrame, column: str = 'time') -> TimeIndex:
+    """Return cached TimeIndex of the column, computed on first use.
+    In place modifications of the column are not detected, call invalidate afterwards.
+
+    :param df: table
+    :param column: time column
+    :return:
+    """
+    values = _values(df, column)
+    key = (id(df), column)
+    with _lock:
+        index = _cache.get(key)
+        if index is not None and index.matches(values):
+            return index
+    index = TimeIndex(values)
+    with _lock:
+        if key not in _cache:
+            weakref.finalize(df, _cache.pop, key, None)
+        _cache[key] = index
+    return index
+
+
+def invalidate(df: pd.DataFrame, column: str = 'time'):
+    """Drop cached metadata after modifying the time column in place
+
+    :param df: table
+    :param column: time column
+    :return:
+    """
+    with _lock:
+        _cache.pop((id(df), column), None)
+
+
+def time_window(df: pd.DataFrame, t0=None, t1=None, column: str = 'time', closed: str = 'left') -> pd.DataFrame:
+    """Rows with t0 <= time < t1.
+    Uses binary search, for sorted time columns the result is a view without copying.
+
+    :param df: table
+    :param t0: start, None for unbounded
+    :param t1: end, None for unbounded
+    :param column: time column
+    :param closed: 'left' (default), 'right', 'both' or 'neither'
+    :return:
+    """
+    values = _values(df, column)
+    rows = get_time_index(df, column).window(values, t0, t1, closed)
+    return df.iloc[rows]
@@ -0,0 +1,141 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from contextlib import contextmanager
+
+from PyQt5.QtCore import pyqtSignal
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+
+
+class Canvas(FigureCanvasQTAgg):
+    """Matplotlib canvas with a single pass render pipeline
+
+    * the layout is computed inside the next draw, once per plot and resize
+    * draw requests inside coalesce_draws() are deferred to one draw_idle
+    * overlay artists (eg. pick highlights) are blitted on top of a cached background
+    * hidden canvases do not draw, eg. while a worker modifies the figure
+    * every full draw is timed
+
+    """
+    rendered = pyqtSignal(float)
+    "duration of the last full draw in seconds"
+
+    def __init__(self, figure=None):
+        super().__init__(figure)
+        self.last_draw_time = 0.
+        self.last_layout_time = 0.
+        "part of last_draw_time spent in tight_layout"
+
+        self.draw_count = 0
+
+        self._layout = None
+        "tight_layout arguments, None to keep the layout"
+
+        self._layout_pending = False
+        self._deferred = False
+        self._coalesce = 0
+        self._overlays = list()
+        self._background = None
+
+    def request_layout(self, **kwargs):
+        """Compute tight_layout in the next draw and after every resize
+
+        :param kwargs: tight_layout arguments
+        :return:
+        """
+        self._layout = kwargs
+        self._layout_pending = True
+
+    @contextmanager
+    def coalesce_draws(self):
+        """Turn draw calls into a single draw_idle, eg. inside picker callbacks
+
+        :return:
+        """
+        self._coalesce += 1
+        try:
+            yield
+        finally:
+            self._coalesce -= 1
+
+    def add_overlay(self, artist):
+        """Draw artist with blitting instead of full redraws
+
+        :param artist: matplotlib artist, eg. a highlight marker
+        :return:
+        """
+        artist.set_animated(True)
+        self._overlays.append(artist)
+
+    def clear_overlays(self):
+        """Remove all overlay artists
+
+        :return:
+        """
+        for a in self._overlays:
+            a.set_animated(False)
+        self._overlays = list()
+        self._background = None
+
+    def update_overlays(self):
+        """Redraw overlay artists on top of the cached background
+
+        :return:
+        """
+        if self._background is None:
+            self.draw_idle()
+            return
+        self.restore_region(self._background)
+        self._draw_overlays()
+        self.blit(self.figure.bbox)
+
+    def _draw_overlays(self):
+        for a in self._overlays:
+            if a.figure is self.figure:
+                self.figure.draw_artist(a)
+
+    def resizeEvent(self, event):
+        if self._layout is not None:
+            self._layout_pending = True
+        super().resizeEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._deferred:
+            self._deferred = False
+            self.draw_idle()
+
+    def draw(self):
+        if not self.isVisible():
+            self._deferred = True
+            return
+        if self._coalesce:
+            self.draw_idle()
+            return
+
+        t = time.perf_counter()
+        if self._layout_pending and self.figure.axes:
+            self.figure.tight_layout(**self._layout)
+        self._layout_pending = False
+        self.last_layout_time = time.perf_counter() - t
+        super().draw()
+        if self._overlays:
+            self._background = self.copy_from_bbox(self.figure.bbox)
+            self._draw_overlays()
+        self.last_draw_time = time.perf_counter() - t
+        self.draw_count += 1
+        self.rendered.emit(self.last_draw_time)
@@ -0,0 +1,268 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex
+from PyQt5.Qt import Qt
+import numpy as np
+import pandas as pd
+
+FILTER_OPERATORS = ('>=', '<=', '!=', '==', '>', '<', '=')
+
+
+class DataFrameModel(QAbstractTableModel):
+    """Read only table model backed by the column arrays of a DataFrame.
+    Cells are formatted on demand, only for the rows the view requests.
+    Rows are handed to the view in batches (canFetchMore/fetchMore).
+
+    Sorting and filtering never copy the DataFrame. Both compute an array of
+    row positions (argsort, boolean masks) which maps view rows to DataFrame rows.
+    Sort orders are cached per column and reused by comparison filters.
+
+    """
+
+    batch_size = 1000
+    "number of rows made visible per fetchMore call"
+
+    def __init__(self, df: pd.DataFrame, parent=None):
+        super().__init__(parent)
+        self.df = df
+        self._columns = dict()
+        "column position -> numpy array, converted on first access"
+
+        self._sort_cache = dict()
+        "column position -> (argsort order, sorted values)"
+
+        self._filters = dict()
+        "column position -> (filter text, boolean mask)"
+
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._rows = None
+        "view row -> DataFrame row position, None if identity"
+
+        self._row_count = len(df)
+        self._loaded = min(self.batch_size, self._row_count)
+
+    def column(self, col: int):
+        """Column values as numpy array
+
+        :param col: column position
+        :return:
+        """
+        values = self._columns.get(col)
+        if values is None:
+            values = self.df.iloc[:, col].to_numpy()
+            self._columns[col] = values
+        return values
+
+    def row_position(self, row: int) -> int:
+        """Map view row to row position in the DataFrame
+
+        :param row: view row
+        :return:
+        """
+        if self._rows is None:
+            return row
+        return int(self._rows[row])
+
+    def sort_key(self, col: int) -> np.ndarray:
+        """Column values used by sorting and filters, nullable numeric columns as float with NaN for NA
+
+        :param col: column position
+        :return:
+        """
+        dtype = self.df.dtypes.iloc[col]
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'iuf':
+            return self.df.iloc[:, col].to_numpy(float, na_value=np.nan)
+        return self.column(col)
+
+    def sorted_column(self, col: int):
+        """Sort order and sorted values of a column, cached.
+        NaN and NaT are sorted last.
+
+        :param col: column position
+        :return: tuple (order, sorted values)
+        """
+        cached = self._sort_cache.get(col)
+        if cached is None:
+            values = self.sort_key(col)
+            try:
+                order = np.argsort(values)
+            except TypeError:
+                # mixed object column, eg. str and None
+                values = values.astype(str)
+                order = np.argsort(values)
+            cached = (order, values[order])
+            self._sort_cache[col] = cached
+        return cached
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort view by column, column < 0 restores the original order
+
+        :param column: column position
+        :param order: Qt.AscendingOrder or Qt.DescendingOrder
+        :return:
+        """
+        self._sort_column = column
+        self._sort_order = order
+        self._update_rows()
+
+    def get_filter(self, col: int) -> str:
+        """Return filter text of column
+
+        :param col: column position
+        :return:
+        """
+        if col in self._filters:
+            return self._filters[col][0]
+        return ''
+
+    def set_filter(self, col: int, text: str):
+        """Filter rows by column.
+        Supported filters are comparisons (>=, <=, !=, ==, >, <, =) with a value,
+        plain text is an exact match on numeric columns and a substring match otherwise.
+        Empty text removes the filter.
+
+        :param col: column position
+        :param text: filter expression
+        :return:
+        """
+        text = text.strip()
+        if not text:
+            self._filters.pop(col, None)
+        else:
+            self._filters[col] = (text, self._filter_mask(col, text))
+        self._update_rows()
+
+    def clear_filters(self):
+        """Remove all filters
+
+        :return:
+        """
+        self._filters = dict()
+        self._update_rows()
+
+    def total_rows(self) -> int:
+        """number of rows after filtering"""
+        return self._row_count
+
+    def _filter_mask(self, col: int, text: str) -> np.ndarray:
+        op = None
+        for o in FILTER_OPERATORS:
+            if text.startswith(o):
+                op = '==' if o == '=' else o
+                text = text[len(o):].strip()
+                break
+
+        values = self.sort_key(col)
+        if op is None and values.dtype.kind not in 'biufmM':
+            s = pd.Series(values, copy=False).astype(str)
+            return s.str.contains(text, case=False, regex=False).to_numpy()
+
+        if op is None:
+            op = '=='
+        order, sorted_values = self.sorted_column(col)
+        value = self._parse_value(sorted_values.dtype, text)
+        left = np.searchsorted(sorted_values, value, side='left')
+        right = np.searchsorted(sorted_values, value, side='right')
+        n = len(sorted_values)
+        # NaN and NaT are sorted last and match no comparison
+        if sorted_values.dtype.kind in 'fc':
+            n = np.searchsorted(sorted_values, np.nan, side='left')
+        elif sorted_values.dtype.kind in 'mM':
+            n = np.searchsorted(sorted_values, np.array('NaT', dtype=sorted_values.dtype), side='left')
+        ranges = {
+            '==': [(left, right)],
+            '!=': [(0, left), (right, n)],
+            '>': [(right, n)],
+            '>=': [(left, n)],
+            '<': [(0, left)],
+            '<=': [(0, right)],
+        }[op]
+        mask = np.zeros(len(values), dtype=bool)
+        for a, b in ranges:
+            mask[order[a:b]] = True
+        return mask
+
+    @staticmethod
+    def _parse_value(dtype: np.dtype, text: str):
+        if dtype.kind == 'b':
+            return text.lower() in ('1', 'true', 'yes')
+        if dtype.kind in 'iu':
+            v = float(text)
+            return int(v) if v.is_integer() else v
+        if dtype.kind == 'f':
+            return float(text)
+        if dtype.kind in 'mM':
+            return np.array(text).astype(dtype)
+        return text
+
+    def _update_rows(self):
+        self.beginResetModel()
+        mask = None
+        for _, m in self._filters.values():
+            mask = m if mask is None else mask & m
+
+        if self._sort_column < 0:
+            rows = None if mask is None else np.flatnonzero(mask)
+        else:
+            rows = self.sorted_column(self._sort_column)[0]
+            if self._sort_order == Qt.DescendingOrder:
+                rows = rows[::-1]
+            if mask is not None:
+                rows = rows[mask[rows]]
+
+        self._rows = rows
+        self._row_count = len(self.df) if rows is None else len(rows)
+        self._loaded = min(self.batch_size, self._row_count)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.df.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return str(self.column(index.column())[self.row_position(index.row())])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self.df.columns[section])
+        return str(self.row_position(section) + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded < self._row_count
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        n = min(self.batch_size, self._row_count - self._loaded)
+        if n <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + n - 1)
+        self._loaded += n
+        self.endInsertRows()
@@ -0,0 +1,85 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, \
+    QHeaderView, QFileDialog
+
+from ..Profiler import Profiler, COLUMNS, PHASES
+from ..helper import format_bytes
+
+
+class ProfileHistory(QDialog):
+    """Profile history dialog: one row per profiled run, export as CSV or JSON
+
+    """
+
+    def __init__(self, profiler: Profiler, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Profile History')
+        self.resize(1200, 500)
+        self.profiler = profiler
+
+        self.layout = QVBoxLayout()
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.layout.addWidget(self.table)
+
+        self.layoutH = QHBoxLayout()
+        for text, func in (('Export CSV', self.on_export_csv), ('Export JSON', self.on_export_json),
+                           ('Clear', self.on_clear), ('Close', self.close)):
+            b = QPushButton(text)
+            b.clicked.connect(func)
+            self.layoutH.addWidget(b)
+        self.layout.addLayout(self.layoutH)
+        self.setLayout(self.layout)
+        self.refresh()
+
+    @staticmethod
+    def format_value(column: str, value) -> str:
+        if value is None:
+            return ''
+        if column == 'peak_memory':
+            return format_bytes(value)
+        if column in PHASES or column in ('total', 'cpu'):
+            return '%.1f ms' % (value * 1000)
+        return str(value)
+
+    def refresh(self):
+        """Show all runs of the profiler history
+
+        :return:
+        """
+        records = self.profiler.records()
+        self.table.setRowCount(len(records))
+        for row, r in enumerate(records):
+            for col, c in enumerate(COLUMNS):
+                self.table.setItem(row, col, QTableWidgetItem(self.format_value(c, r[c])))
+        self.table.scrollToBottom()
+
+    def on_export_csv(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export CSV', 'profile.csv', 'CSV (*.csv)')
+        if path:
+            self.profiler.export_csv(path)
+
+    def on_export_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export JSON', 'profile.json', 'JSON (*.json)')
+        if path:
+            self.profiler.export_json(path)
+
+    def on_clear(self):
+        self.profiler.clear()
+        self.refresh()
@@ -0,0 +1,94 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QComboBox, QLineEdit, QPushButton, QLabel
+
+import typing
+if typing.TYPE_CHECKING:
+    from .DataFrameModel import DataFrameModel
+
+
+class TableFilter(QWidget):
+    """Per column filter bar for a DataFrameModel
+
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model: typing.Optional['DataFrameModel'] = None
+
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel('Filter'))
+        self.column = QComboBox()
+        self.column.currentIndexChanged.connect(self.on_column_changed)
+        layout.addWidget(self.column)
+        self.text = QLineEdit()
+        self.text.setPlaceholderText('eg. >5, ==abc, abc')
+        self.text.returnPressed.connect(self.apply)
+        layout.addWidget(self.text)
+        self.clearButton = QPushButton('clear filters')
+        self.clearButton.clicked.connect(self.clear)
+        layout.addWidget(self.clearButton)
+        self.rows = QLabel()
+        layout.addWidget(self.rows)
+        self.setLayout(layout)
+
+    def set_model(self, model: 'DataFrameModel'):
+        """Attach filter bar to table model
+
+        :param model:
+        :return:
+        """
+        self.model = model
+        self.column.blockSignals(True)
+        self.column.clear()
+        self.column.addItems([str(c) for c in model.df.columns])
+        self.column.blockSignals(False)
+        self.text.clear()
+        self.update_rows()
+
+    def on_column_changed(self, i):
+        if self.model is not None:
+            self.text.setText(self.model.get_filter(i))
+
+    def apply(self):
+        """Apply filter text to selected column
+
+        :return:
+        """
+        if self.model is None or self.column.currentIndex() < 0:
+            return
+        try:
+            self.model.set_filter(self.column.currentIndex(), self.text.text())
+        except (ValueError, TypeError) as e:
+            self.rows.setText('invalid filter: %s' % e)
+            return
+        self.update_rows()
+
+    def clear(self):
+        """Remove all filters
+
+        :return:
+        """
+        if self.model is None:
+            return
+        self.text.clear()
+        self.model.clear_filters()
+        self.update_rows()
+
+    def update_rows(self):
+        self.rows.setText('{:,} of {:,} rows'.format(self.model.total_rows(), len(self.model.df)))
@@ -14,29 +14,36 @@
 # You should have received a copy of the GNU General Public License
 # along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5.QtWidgets import QTableWidget, QMenu
+from PyQt5.QtWidgets import QTableView, QMenu
+from PyQt5.Qt import Qt
 
 
-class TableWidget(QTableWidget):
-    """Custom QTableWidget with context menu event
+class TableWidget(QTableView):
+    """Custom QTableView with context menu event
 
     """
     def __init__(self, mod, parent=None):
-        QTableWidget.__init__(self, parent)
+        QTableView.__init__(self, parent)
         self.mod = mod
 
     def contextMenuEvent(self, event):
         index = self.indexAt(event.pos())
-        row = index.row()
-        col = index.column()
-        header = self.horizontalHeaderItem(col).text()
-        item = self.item(row, col).text()
-        if header in self.mod.window.tableActions.keys():
+        model = self.model()
+        if model is None or not index.isValid():
+            return
+        header = model.headerData(index.column(), Qt.Horizontal)
+        item = model.data(index)
+        actions = self.mod.window.get_table_actions(header)
+        if actions:
             d = dict()
             menu = QMenu(self)
-            for mod, txt, f in self.mod.window.tableActions[header]:
+            for mod, txt, f in actions:
                 d[menu.addAction(txt)] = f
-            action = menu.exec_(self.mapToGlobal(event.pos()))
+            action = menu.exec_(self.viewport().mapToGlobal(event.pos()))
             if action in d.keys():
-                self.mod.window.settings.set_setting(header, item)
+                try:
+                    self.mod.window.settings.set_setting(header, item)
+                except ValueError as e:
+                    self.mod.window.msg('Error: %s' % e)
+                    return
                 d[action](item)
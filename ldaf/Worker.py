@@ -0,0 +1,85 @@
+# Copyright (C) 2023 Tobias Specht
+# This file is part of ldaf <https://github.com/peckto/ldaf>.
+#
+# ldaf is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ldaf is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class Cancelled(Exception):
+    """Raised inside an analysis function when the user cancelled the run
+
+    """
+    pass
+
+
+class CancelToken(object):
+    """Cooperative cancellation token passed to analysis functions
+
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Request cancellation
+
+        :return:
+        """
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """True if cancellation was requested"""
+        return self._event.is_set()
+
+    def check(self):
+        """Raise Cancelled if cancellation was requested.
+        Call regularly inside long running loops.
+
+        :return:
+        """
+        if self.cancelled:
+            raise Cancelled()
+
+
+class Worker(QThread):
+    """Run a function in a background thread.
+    Return value and exception of the function are stored in result and error.
+
+    """
+    progress = pyqtSignal(int)
+    "progress in percent, emitted from the worker thread"
+
+    def __init__(self, func, parent=None):
+        QThread.__init__(self, parent)
+        self.func = func
+        self.result = None
+        self.error: Exception = None
+
+    def run(self):
+        try:
+            self.result = self.func()
+        except Exception as e:
+            self.error = e
+
+    def report_progress(self, percent):
+        """Progress callback, safe to call from the worker thread
+
+        :param percent: 0 - 100
+        :return:
+        """
+        self.progress.emit(int(percent))
+
@@ -14,17 +14,53 @@
 # You should have received a copy of the GNU General Public License
 # along with ldaf.  If not, see <http://www.gnu.org/licenses/>.
 
+import ast
 import importlib.util
+import inspect
+import io
 import time
-import pandas as pd
 import sys
 import os
 
 import typing
 if typing.TYPE_CHECKING:
+    import pandas as pd
     from .App import App
 
 
+def kind_of(value) -> str:
+    """Setting kind of a default value, see Settings.KINDS
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    return 'str'
+
+
+def parse_setting(text: str, kind: str):
+    """Value of a setting entered as text, str values which are numeric are read as int
+
+    :param text:
+    :param kind: see Settings.KINDS
+    :return: value, raises ValueError if the text does not match the kind
+    """
+    if kind == 'int':
+        return int(text)
+    if kind == 'float':
+        return float(text)
+    if kind == 'bool':
+        return text.lower() in ('1', 'true', 'yes', 'on')
+    if text.isnumeric():
+        return int(text)
+    return text
+
+
 def load_module(path: str):
     """Load a Analysis Module from path.
     Path can be external. Path will be added os.path
@@ -37,23 +73,124 @@ def load_module(path: str):
     foo = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(foo)
     sys.modules[name] = foo
-    sys.path.append(os.path.dirname(os.path.abspath(path)))
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory not in sys.path:
+        sys.path.append(directory)
     return foo
 
 
-def log_time_frame(df: pd.DataFrame, app: 'App'):
-    """Log time span fo DataFrame in App logging widget
+def read_module_info(path: str) -> dict:
+    """Read name, table, settings and the keys of functions and actions of an analysis module without importing it.
+    Only literal values are read, other values are None and their keys are listed in dynamic.
+    Missing functions and actions are empty lists, other missing values are None.
+
+    :param path: Path to Python file
+    :return: dict with keys name, table, settings, functions, actions, dynamic
+    """
+    info = dict.fromkeys(('name', 'table', 'settings'))
+    info.update(functions=list(), actions=list(), dynamic=set())
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or len(node.targets) != 1 or not isinstance(node.targets[0], ast.Name):
+            continue
+        key = node.targets[0].id
+        if key not in info or key == 'dynamic':
+            continue
+        info['dynamic'].discard(key)
+        if key in ('functions', 'actions'):
+            if isinstance(node.value, ast.Dict) and all(isinstance(k, ast.Constant) for k in node.value.keys):
+                info[key] = [k.value for k in node.value.keys]
+            else:
+                info[key] = None
+                info['dynamic'].add(key)
+            continue
+        try:
+            info[key] = ast.literal_eval(node.value)
+        except ValueError:
+            info[key] = None
+            info['dynamic'].add(key)
+    return info
+
+
+def call_analysis(func, app, **kwargs):
+    """Call analysis function with the keyword arguments it accepts.
+    Allows optional arguments like token and progress without breaking
+    functions with the plain (app, fig=None) signature.
+
+    :param func: analysis function
+    :param app: Application
+    :param kwargs: optional keyword arguments
+    :return: return value of func
+    """
+    params = inspect.signature(func).parameters
+    if not any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params.values()):
+        kwargs = {k: v for k, v in kwargs.items() if k in params}
+    return func(app, **kwargs)
+
+
+def format_bytes(n: int) -> str:
+    """Format size in bytes human readable, eg. 1.5 MiB
+
+    :param n: size in bytes
+    :return:
+    """
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(n) < 1024:
+            return '%.1f %s' % (n, unit) if unit != 'B' else '%d B' % n
+        n /= 1024
+    return '%.1f TiB' % n
+
+
+def read_csv_tail(path: str, offset: int = 0, names: list = None, **kwargs) -> typing.Tuple['pd.DataFrame', int]:
+    """Read the complete lines appended to a csv file since offset.
+    Use as high-water mark for DataSource.read_new_rows.
+
+    :param path: csv file
+    :param offset: byte offset returned by the previous call, 0 to read the file including the header
+    :param names: column names, required for offset > 0
+    :param kwargs: passed to pd.read_csv
+    :return: new rows (None if there are no new lines), new offset
+    """
+    import pandas as pd
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    # an incomplete last line is read on the next call
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return None, offset
+    buf = io.BytesIO(data[:end])
+    if offset == 0:
+        df = pd.read_csv(buf, header=0, names=names, **kwargs)
+    else:
+        df = pd.read_csv(buf, header=None, names=names, **kwargs)
+    return df, offset + end
+
+
+def log_time_frame(df: 'pd.DataFrame', app: 'App', column: str = 'time'):
+    """Log time span fo DataFrame in App logging widget.
+    Min and max are cached per table (see TimeIndex), repeated calls are O(1).
 
     :param df: Input DataFrame
     :param app: Application
+    :param column: time column, epoch seconds or datetime
     :return:
     """
-    if 'time' in df.columns:
-        t1 = df['time'].min()
-        t2 = df['time'].max()
-        t1 = time.gmtime(t1)
-        t2 = time.gmtime(t2)
-        app.log('Time frame: %s - %s' % (time.strftime('%H:%M', t1), time.strftime('%H:%M', t2)))
+    import numpy as np
+    import pandas as pd
+    from .TimeIndex import get_time_index
+    if column in df.columns:
+        index = get_time_index(df, column)
+        if index.min is None:
+            return
+        if isinstance(index.min, (pd.Timestamp, np.datetime64)):
+            t1 = pd.Timestamp(index.min).strftime('%H:%M')
+            t2 = pd.Timestamp(index.max).strftime('%H:%M')
+        else:
+            t1 = time.strftime('%H:%M', time.gmtime(index.min))
+            t2 = time.strftime('%H:%M', time.gmtime(index.max))
+        app.log('Time frame: %s - %s' % (t1, t2))
 
 
 tableau20 = [(31, 119, 180), (174, 199, 232), (255, 127, 14), (255, 187, 120),